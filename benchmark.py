@@ -0,0 +1,270 @@
+""" Offline load test of the bot's handlers.
+
+Drives the commands, the prototype reply listener and the RSVP buttons of bot.py against the in-process fakes in
+fakediscord.py, in a throwaway working directory, and reports throughput and latency percentiles per scenario.
+With --guilds the load is spread round robin over that many guilds, each configured and started like the gateway
+would when the guild becomes available:
+
+    python benchmark.py --events 10000 --clicks 500 --output bench_output.txt
+"""
+import argparse
+import asyncio
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+import importlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from types import ModuleType, SimpleNamespace
+
+from fakediscord import FakeApp, FakeImageValidator, FakeSlashContext, FakeViewContext, guild_message
+
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+
+GUILD_ID = 1
+EVENT_CHANNEL_ID = 100
+PROTOTYPE_CHANNEL_ID = 101
+ROLE_CHANNEL_ID = 102
+ENIGMA_ROLE_ID = 103
+ORGANIZER_ID = 200
+# attendees clicking the RSVP buttons get ids from here on
+FIRST_MEMBER_ID = 10_000
+
+
+@dataclass
+class Result:
+    scenario: str
+    latencies: list[float]
+    elapsed: float
+    rest_calls: Counter[str]
+
+    def percentile(self, q: float) -> float:
+        """ nearest-rank percentile of the latencies in seconds """
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+
+    def line(self) -> str:
+        throughput = len(self.latencies) / self.elapsed if self.elapsed else 0.0
+        calls = ", ".join(f"{method}={count}" for method, count in sorted(self.rest_calls.items()))
+        return (f"{self.scenario:<22} {len(self.latencies):>7} {self.elapsed:>9.3f} {throughput:>10.1f} "
+                + " ".join(f"{self.percentile(q) * 1000:>8.2f}" for q in (0.5, 0.9, 0.99, 1.0))
+                + f"  {calls}")
+
+
+HEADER = (f"{'scenario':<22} {'ops':>7} {'total s':>9} {'ops/s':>10} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}  rest calls")
+
+
+class Benchmark:
+    def __init__(self, bot: ModuleType, app: FakeApp, concurrency: int, guild_ids: list[int]) -> None:
+        self.bot = bot
+        self.app = app
+        self.concurrency = concurrency
+        self.guild_ids = guild_ids
+        self.results: list[Result] = []
+
+    async def measure(self, scenario: str, operations: list[Callable[[], Awaitable[object]]],
+                      settle: Callable[[], Awaitable[object]] | None = None) -> None:
+        """ runs the operations, at most `concurrency` at a time, and records how long each one took.
+
+        REST calls made until `settle` returns, like debounced or queued ones, count towards the scenario but not
+        towards its time.
+        """
+        latencies: list[float] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(operation: Callable[[], Awaitable[object]]) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await operation()
+                latencies.append(time.perf_counter() - start)
+
+        calls_before = Counter(self.app.rest.calls)
+        start = time.perf_counter()
+        await asyncio.gather(*(run(operation) for operation in operations))
+        elapsed = time.perf_counter() - start
+        if settle is not None:
+            await settle()
+        self.results.append(Result(scenario, latencies, elapsed, self.app.rest.calls - calls_before))
+
+    def guild_id(self, i: int) -> int:
+        return self.guild_ids[i % len(self.guild_ids)]
+
+    def context(self, guild_id: int = GUILD_ID, **options: object) -> FakeSlashContext:
+        return FakeSlashContext(self.app, ORGANIZER_ID, guild_id, PROTOTYPE_CHANNEL_ID, **options)
+
+    async def start_guilds(self) -> None:
+        # the handler only reads the guild id and the app of the event
+        await self.measure("guild available", [
+            lambda event=SimpleNamespace(guild_id=guild_id, app=self.app): self.bot.guilds.on_guild_available(event)
+            for guild_id in self.guild_ids])
+
+    async def add_events(self, count: int) -> None:
+        await self.measure("addevent", [
+            lambda i=i: self.bot.add_event.callback(self.context(self.guild_id(i), event_name=f"event {i:06d}",
+                                                                 event_link=f"https://example.com/events/{i}",
+                                                                 start=None, end=None))
+            for i in range(count)])
+
+    async def post_events(self, count: int) -> None:
+        """ replies to the qualifier messages of the first `count` events, first with a description then to post """
+        for stage, scenario in ((self.bot.WorkflowStage.describe, "describe reply"),
+                                (self.bot.WorkflowStage.post, "post reply")):
+            message_ids = sorted((message_id, guild_id) for guild_id in self.guild_ids
+                                 for message_id, state in self.bot.guilds.loaded(guild_id).workflow.states.items()
+                                 if state.stage is stage)[:count]
+            await self.measure(scenario, [lambda message_id=message_id, guild_id=guild_id: self.reply(guild_id,
+                                                                                                       message_id)
+                                          for message_id, guild_id in message_ids])
+
+    async def reply(self, guild_id: int, message_id: int) -> None:
+        qualifier = self.app.rest.message(PROTOTYPE_CHANNEL_ID, "qualifier", message_id=message_id, guild_id=guild_id)
+        content = f"https://example.com/images/{message_id}.png\na description of the event"
+        await self.bot.on_prototype_reply(guild_message(self.app, PROTOTYPE_CHANNEL_ID, content, ORGANIZER_ID,
+                                                        referenced_message=qualifier, guild_id=guild_id))
+
+    async def click_rsvp(self, clicks: int, update_interval: float) -> None:
+        """ a burst of joins spread over the posted events, then the same members leaving again """
+        posted = []
+        for guild_id in self.guild_ids:
+            async with self.bot.EventManager(guild_id) as eventmanager:
+                posted += [(guild_id, event) for event in eventmanager.get_submitted_events()
+                           if event.message_id is not None]
+        if not posted:
+            return
+        messages = [(guild_id, self.app.rest.message(event.channel_id, "", message_id=event.message_id,
+                                                     guild_id=guild_id))
+                    for guild_id, event in posted]
+        updater = self.bot.eventviews.AttendeeCountUpdater(self.bot.rest, update_interval)
+        view = self.bot.eventviews.EventView(updater=updater)
+        buttons = {item.custom_id: item for item in view.children}
+        for custom_id, scenario in ((self.bot.eventviews.JOIN_EVENT_ID, "join click"),
+                                    (self.bot.eventviews.LEAVE_EVENT_ID, "leave click")):
+            button = buttons[custom_id]
+            await self.measure(scenario, [
+                lambda i=i: button.callback(FakeViewContext(self.app, messages[i % len(messages)][1],
+                                                            FIRST_MEMBER_ID + i, messages[i % len(messages)][0]))
+                for i in range(clicks)], settle=lambda: asyncio.sleep(update_interval * 2))
+
+    async def list_events(self, repeat: int) -> None:
+        await self.measure("list-unsubmitted", [
+            lambda i=i: self.bot.list_unsubmitted_events.callback(self.context(self.guild_id(i)))
+            for i in range(repeat)])
+        await self.measure("list-submitted", [
+            lambda i=i: self.bot.list_submitted_events.callback(self.context(self.guild_id(i)))
+            for i in range(repeat)])
+        await self.measure("events list", [
+            lambda i=i: self.bot.list_events.callback(self.context(self.guild_id(i), prefix=f"event {i % 10}",
+                                                                   organizer=None, state=None))
+            for i in range(repeat)])
+        await self.measure("events search", [
+            lambda i=i: self.bot.search_events.callback(self.context(self.guild_id(i), text=f"{i % 100:02d}",
+                                                                     organizer=None, state=None))
+            for i in range(repeat)])
+        await self.measure("autocomplete", [
+            lambda i=i: self.bot.complete_event_name(SimpleNamespace(value=f"event {i % 100:02d}"),
+                                                     SimpleNamespace(guild_id=self.guild_id(i)))
+            for i in range(repeat)])
+
+    async def update_years(self, repeat: int) -> None:
+        await self.measure("update_years", [lambda i=i: self.bot.update_year.callback(self.context(self.guild_id(i)))
+                                            for i in range(repeat)])
+
+    async def select_roles(self, selections: int) -> None:
+        """ members picking a year from the role menu, each changing their mind once """
+        years = sorted(self.bot.guilds.loaded(GUILD_ID).year_roles.roles.items())
+        if not years:
+            return
+        self.bot.role_assigner.start(self.app.rest)
+        view = self.bot.RoleView(self.bot.guilds.year_roles, self.bot.role_assigner)
+        menu = self.app.rest.message(ROLE_CHANNEL_ID, "")
+        select = view.year_select
+        for first_pick in (True, False):
+            await self.measure("role select" if first_pick else "role reselect", [
+                lambda i=i: self.select_year(select, menu, FIRST_MEMBER_ID + i % selections,
+                                             years[(i + first_pick) % len(years)][1])
+                for i in range(selections)], settle=self.bot.role_assigner.queue.join)
+        await self.bot.role_assigner.stop()
+
+    async def select_year(self, select: object, menu: object, user_id: int, role_id: int) -> None:
+        # miru fills in the values from the interaction payload, which the fake context doesn't have
+        select._values = (str(role_id),)
+        await select.callback(FakeViewContext(self.app, menu, user_id, GUILD_ID))
+
+    def report(self) -> str:
+        return "\n".join([HEADER] + [result.line() for result in self.results])
+
+
+def import_bot(storage: str, update_interval: float, guild_ids: list[int]) -> ModuleType:
+    """ imports bot.py against a config for the fake guilds, from the current working directory """
+    os.makedirs("config/guilds", exist_ok=True)
+    os.makedirs("statefiles", exist_ok=True)
+    guild_config = {"event_channel_id": EVENT_CHANNEL_ID, "enigma_role_id": ENIGMA_ROLE_ID,
+                    "role_channel_id": ROLE_CHANNEL_ID, "event_prototype_channel_id": PROTOTYPE_CHANNEL_ID}
+    with open("config/config.json", "w") as config_file:
+        json.dump({"token": "benchmark", "enigma_discord_id": GUILD_ID, "event_storage": storage,
+                   "rsvp_update_interval_seconds": update_interval, "log_level": "WARNING", **guild_config},
+                  config_file)
+    for guild_id in guild_ids[1:]:
+        with open(f"config/guilds/{guild_id}.json", "w") as guild_file:
+            json.dump(guild_config, guild_file)
+    sys.path.insert(0, REPOSITORY)
+    return importlib.import_module("bot")
+
+
+async def run(arguments: argparse.Namespace) -> str:
+    guild_ids = [GUILD_ID + i for i in range(arguments.guilds)]
+    bot = import_bot(arguments.storage, arguments.update_interval, guild_ids)
+    app = FakeApp(arguments.rest_latency)
+    # the handlers look the bot up as a module global, so swapping it routes all of their REST calls to the fake
+    bot.bot = app
+    bot.image_validator = FakeImageValidator(arguments.rest_latency)
+    benchmark = Benchmark(bot, app, arguments.concurrency, guild_ids)
+    await benchmark.start_guilds()
+    await benchmark.add_events(arguments.events)
+    await benchmark.post_events(arguments.posts)
+    await benchmark.click_rsvp(arguments.clicks, arguments.update_interval)
+    await benchmark.list_events(arguments.repeat)
+    await benchmark.update_years(arguments.repeat)
+    await benchmark.select_roles(arguments.clicks)
+    await bot.guilds.stop()
+    await bot.flush_events()
+    return (f"{arguments.events} events, {arguments.posts} posted, {arguments.clicks} clicks, "
+            f"{arguments.guilds} guilds, {arguments.storage} storage, {arguments.rest_latency * 1000:g} ms REST latency, "
+            f"concurrency {arguments.concurrency}\n{benchmark.report()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10_000, help="events created with /addevent")
+    parser.add_argument("--posts", type=int, default=200, help="events described and posted through replies")
+    parser.add_argument("--clicks", type=int, default=500,
+                        help="concurrent join clicks, as many leave clicks and as many role menu selections")
+    parser.add_argument("--repeat", type=int, default=20, help="invocations of each listing command")
+    parser.add_argument("--concurrency", type=int, default=50, help="operations in flight at once")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="seconds each fake REST call takes")
+    parser.add_argument("--update-interval", type=float, default=0.05, help="attendee count debounce in seconds")
+    parser.add_argument("--guilds", type=int, default=1, help="guilds the load is spread over")
+    parser.add_argument("--storage", choices=("journal", "json", "sqlite"), default="journal")
+    parser.add_argument("--output", help="also write the report to this file")
+    arguments = parser.parse_args()
+
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+        os.chdir(directory)
+        try:
+            report = asyncio.run(run(arguments))
+        finally:
+            os.chdir(working_directory)
+    print(report)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
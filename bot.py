@@ -1,92 +1,253 @@
 import re
+import asyncio
+from collections.abc import Iterable
+import logging
+import time
 import hikari
 import miru
 from hikari.events import message_events
 import lightbulb
 from configmanager import ConfigManager
-from events import Event, EventManager, DuplicateEventError
+from events import Event, EventManager, EventQuery, EventState, DuplicateEventError, EventConflictError, \
+    EventNotFoundError, EventStorage, configure_storage, flush_events, JsonFileStorage
+from eventjournal import EventJournal
+from sqlitestorage import SqliteStorage
 import eventviews
+from embeds import event_embed
+from eventscheduler import parse_event_time
+from guildstate import GuildState, GuildStates
+from imagevalidator import ImageValidator
+from workflow import WorkflowStage
 import datetime
+from functools import partial
+from restqueue import RateLimitCounter, RestExecutor, message_bucket, paginate_embeds
+from roleassigner import MemberRoleCache, RoleAssigner
+from roleregistry import YearRoleUpdateError
 from roleview import RoleView
+from metrics import registry, start_metrics_server, timed_async
 
 config = ConfigManager()
-bot = lightbulb.BotApp(token=config.token)
+storage_backends = {"json": JsonFileStorage, "journal": EventJournal, "sqlite": SqliteStorage}
+
+
+def guild_storage(guild_id: int | None) -> EventStorage:
+    """ every guild's events are kept in a partition of their own, next to the rest of the guild's state """
+    if guild_id is None:
+        # e.g. an interaction from a DM, which has no events of its own
+        raise ValueError("events are kept per guild, there is no guild to keep these in")
+    return storage_backends[config.event_storage].in_directory(config.state_path(guild_id))
+
+
+configure_storage(guild_storage)
+intents = hikari.Intents.ALL_UNPRIVILEGED
+if config.member_events:
+    # privileged, has to be enabled for the bot in the developer portal as well
+    intents |= hikari.Intents.GUILD_MEMBERS
+bot = lightbulb.BotApp(token=config.token, logs=config.log_level, intents=intents)
+logger = logging.getLogger("bot")
+logging.getLogger("hikari.rest").addFilter(RateLimitCounter())
 miru.install(bot)
-year_roles: dict[int, hikari.Role.id] = {}
+rest = RestExecutor()
+image_validator = ImageValidator()
+member_roles = MemberRoleCache()
+role_assigner = RoleAssigner(rest, member_roles)
 
 new_event_qualifier = "new event qualifier"
 post_event_qualifier = "post event qualifier"
+rsvp_updater = eventviews.AttendeeCountUpdater(rest, config.rsvp_update_interval)
+guilds = GuildStates(config, rest, rsvp_updater)
+# events created with a start but no end last this long
+DEFAULT_EVENT_DURATION = datetime.timedelta(hours=2)
+ARCHIVE_PAGE_SIZE = 10
+# perf_counter at which each running command was invoked, keyed by the id of its context
+command_started: dict[int, float] = {}
+metrics_runner = None
+
+
+@bot.listen(hikari.StartedEvent)
+async def on_started(_: hikari.StartedEvent) -> None:
+    # one persistent view serves the RSVP buttons of every posted event in every guild, including those posted before
+    # a restart
+    await eventviews.EventView(updater=rsvp_updater).start()
+    role_assigner.start(bot.rest)
+    await RoleView(guilds.year_roles, role_assigner).start()
+    if config.metrics_port is not None:
+        global metrics_runner
+        metrics_runner = await start_metrics_server(config.metrics_port)
+        logger.info("serving metrics on port %s", config.metrics_port)
+
+
+@bot.listen(hikari.StoppingEvent)
+async def on_stopping(_: hikari.StoppingEvent) -> None:
+    await role_assigner.stop()
+    await guilds.stop()
+    await flush_events()
+    await image_validator.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+bot.subscribe(hikari.GuildAvailableEvent, guilds.on_guild_available)
+bot.subscribe(hikari.GuildJoinEvent, guilds.on_guild_available)
+
+
+async def on_member_create(event: hikari.MemberCreateEvent) -> None:
+    member_roles.remember(event.member)
+
+
+async def on_member_update(event: hikari.MemberUpdateEvent) -> None:
+    member_roles.remember(event.member)
+
+
+async def on_member_delete(event: hikari.MemberDeleteEvent) -> None:
+    member_roles.forget(event.guild_id, event.user_id)
+
+
+# without the intent the role cache is fed by the member sent along with each role menu interaction only
+if config.member_events:
+    bot.subscribe(hikari.MemberCreateEvent, on_member_create)
+    bot.subscribe(hikari.MemberUpdateEvent, on_member_update)
+    bot.subscribe(hikari.MemberDeleteEvent, on_member_delete)
 
 
-@bot.listen()
-async def on_event_description(message: hikari.GuildMessageCreateEvent) -> None:
-    (is_reply, event) = is_reply_action(new_event_qualifier, message)
-    if not is_reply:
+@bot.listen(lightbulb.CommandInvocationEvent)
+async def on_command_invocation(event: lightbulb.CommandInvocationEvent) -> None:
+    logger.info("%s invoked /%s", event.context.author.id, event.command.qualname)
+    command_started[id(event.context)] = time.perf_counter()
+
+
+@bot.listen(lightbulb.CommandCompletionEvent)
+async def on_command_completion(event: lightbulb.CommandCompletionEvent) -> None:
+    observe_command(event.context, "ok")
+
+
+@bot.listen(lightbulb.CommandErrorEvent)
+async def on_command_error(event: lightbulb.CommandErrorEvent) -> None:
+    observe_command(event.context, "error")
+
+
+def observe_command(context: lightbulb.Context, outcome: str) -> None:
+    started = command_started.pop(id(context), None)
+    if started is not None:
+        registry.histogram("bot_command_seconds", command=context.command.qualname,
+                           outcome=outcome).observe(time.perf_counter() - started)
+
+
+@bot.listen(hikari.GuildMessageCreateEvent)
+@timed_async("bot_listener_seconds", listener="prototype_reply")
+async def on_prototype_reply(message: hikari.GuildMessageCreateEvent) -> None:
+    """ single entry point for guild messages, cheap checks first since most messages are not meant for the bot """
+    guild = await guilds.get(message.guild_id)
+    if guild is None or message.channel_id != guild.config.event_prototype_channel:
+        return
+    referenced = message.message.referenced_message
+    if not referenced or not message.is_human or message.message.content is None:
         return
-    print("event description")
-    prototype_channel = config.event_prototype_channel
-    print(message.content)
+    state = guild.workflow.get(referenced.id)
+    if state is None:
+        return
+    async with EventManager(message.guild_id) as eventmanager:
+        try:
+            event = eventmanager.get_by_uuid(state.event_uuid)
+        except EventNotFoundError:
+            return
+    if state.stage is WorkflowStage.describe:
+        await on_event_description(guild, message, event)
+    else:
+        await on_event_post(guild, message, event)
+
+
+async def on_event_description(guild: GuildState, message: hikari.GuildMessageCreateEvent, event: Event) -> None:
+    logger.info("description for event %s", event.name)
+    prototype_channel = guild.config.event_prototype_channel
     img_link = message.content.split("\n")[0]
     event_description = message.content.removeprefix(img_link + "\n")
-    print(f'{event_description = }')
-    match = event.split("\n")
-    event_name = match[0].replace("**", "")
-    print(f'{event_name = }')
-    with EventManager() as eventmanager:
-        eventmanager.set_event_description(event_name, event_description)
-        eventmanager.set_image_link(event_name, img_link)
-        print("event description: ", event_description)
-        print("img link: ", img_link)
+    logger.debug("event description: %r, image link: %r", event_description, img_link)
+    if not await image_validator.is_image(img_link):
+        await message.message.respond("the first line of your reply has to be a link to an image, please try again")
+        return
+    event_name = event.name
+    async with EventManager(message.guild_id) as eventmanager:
+        try:
+            async with eventmanager.transaction(event_name) as transaction:
+                transaction.set_event_description(event_description)
+                transaction.set_image_link(img_link)
+        except EventConflictError:
+            await message.message.respond("the event was changed while saving your description, please try again")
+            return
         new_event: Event = eventmanager[event_name]
 
-        await bot.rest.create_message(prototype_channel,
-                                      "your event will be represented like this:\n")
-        embed = hikari.Embed(title=event_name, description=str(new_event.description), url=new_event.link,
-                             color=0x00ff00)
-        embed.set_image(new_event.image_link)
-        embed.set_author(name="Enigma", icon="https://avatars.githubusercontent.com/u/112754344?s=200&v=4")
-        embed.set_footer(text="Syddanske Softwarestuderendes Fagråd")
-        print("event name", new_event.name)
-        view = eventviews.EventView(timeout=60)
-        await bot.rest.create_message(prototype_channel, components=view, embed=embed,
-                                                   flags=hikari.MessageFlag.EPHEMERAL)
-        await bot.rest.create_message(prototype_channel, f"{post_event_qualifier}\n{new_event.name}\n **reply to this "
-                                                         f"message to post your event**")
-        await bot.rest.create_message(prototype_channel,
-                                      f"If you want to change your event, "
-                                      f"you can redo this step by"
-                                      f"replying to the message that **starts with: {new_event_qualifier}** \n "
-                                      )
-
-
-@bot.listen()
-async def on_event_post(message: hikari.GuildMessageCreateEvent) -> None:
-    (is_reply, event) = is_reply_action(post_event_qualifier, message)
-    if not is_reply:
+        embed = event_embed(new_event)
+        view = eventviews.EventView()
+        # the messages have to arrive in this order, so they are sent one after the other, but as two messages
+        # instead of four
+        await rest.run(message_bucket(prototype_channel),
+                       partial(bot.rest.create_message, prototype_channel,
+                               "your event will be represented like this:\n", components=view, embed=embed,
+                               flags=hikari.MessageFlag.EPHEMERAL))
+        post_qualifier_message = await rest.run(message_bucket(prototype_channel),
+                                                partial(bot.rest.create_message, prototype_channel,
+                                                        f"{post_event_qualifier}\n{new_event.name}\n **reply to this "
+                                                        f"message to post your event**\n"
+                                                        f"If you want to change your event, you can redo this step by "
+                                                        f"replying to the message that **starts with: "
+                                                        f"{new_event_qualifier}** \n "))
+        await guild.workflow.register(post_qualifier_message.id, new_event.uuid, WorkflowStage.post)
+
+
+async def on_event_post(guild: GuildState, message: hikari.GuildMessageCreateEvent, event: Event) -> None:
+    logger.info("posting event %s", event.name)
+    event_name = event.name
+    event_channel = guild.config.event_channel
+    event_post = None
+    try:
+        async with EventManager(message.guild_id) as eventmanager, \
+                eventmanager.transaction(event_name) as transaction:
+            new_event: Event = transaction.event
+            # a second reply that got past the workflow table before the first one was done
+            if new_event.state is EventState.submitted:
+                await message.message.respond("this event has already been posted")
+                return
+            embed = event_embed(new_event)
+            view = eventviews.EventView(len(new_event.attendees))
+            event_post = await rest.run(message_bucket(event_channel),
+                                        partial(bot.rest.create_message, event_channel, components=view, embed=embed,
+                                                flags=hikari.MessageFlag.EPHEMERAL))
+            await message.message.add_reaction("👍")
+            transaction.set_post(event_channel, event_post.id)
+            transaction.submit_event()
+    except (EventNotFoundError, EventConflictError):
+        # deleted or replaced before the transaction got the event, a post nothing records would be an orphan
+        if event_post is not None:
+            await rest.run(message_bucket(event_channel),
+                           partial(bot.rest.delete_message, event_channel, event_post.id))
+        await message.message.respond("the event was deleted or changed while posting it")
         return
-    print("on event post")
-    event_name = event.split("\n")[0].replace("***", "")
-    print(f'{event_name = }')
-    with EventManager() as eventmanager:
-        new_event: Event = eventmanager[event_name]
-        print("img_link:" + new_event.image_link)
-        embed = hikari.Embed(title=event_name, description=str(new_event.description), url=new_event.link,
-                             color=0x00ff00)
-        embed.set_image(new_event.image_link)
-        embed.set_author(name="Enigma", icon="https://avatars.githubusercontent.com/u/112754344?s=200&v=4")
-        embed.set_footer(text="Syddanske Softwarestuderendes Fagråd")
-        print("event name", new_event.name)
-        event_channel = config.event_channel
-        view = eventviews.EventView(timeout=31_629_800)
-        event_post = await bot.rest.create_message(event_channel, components=view, embed=embed,
-                                                   flags=hikari.MessageFlag.EPHEMERAL)
-        await view.start(event_post)
-        await message.message.add_reaction("👍")
-        eventmanager.submit_event(event_name)
+    # replies to the qualifier messages have nothing left to do once the event is posted
+    await guild.workflow.discard_event(event.uuid)
+
+
+@lightbulb.Check
+async def is_event_admin(ctx: lightbulb.Context) -> bool:
+    """ like `lightbulb.has_roles`, with the role configured for the guild the command was used in """
+    guild = await guilds.get(ctx.guild_id) if ctx.guild_id is not None else None
+    if guild is None or ctx.member is None:
+        raise lightbulb.CheckFailure("the bot is not set up in this server")
+    if guild.config.enigma_role_id not in ctx.member.role_ids:
+        raise lightbulb.MissingRequiredRole("You are missing one or more roles required in order to run this command",
+                                            roles=[guild.config.enigma_role_id], mode=all)
+    return True
+
+
+def guild_of(ctx: lightbulb.Context) -> GuildState:
+    """ the guild of a command guarded by `is_event_admin` """
+    return guilds.loaded(ctx.guild_id)
 
 
 @bot.command
-@lightbulb.add_checks(lightbulb.has_roles(config.enigma_role_id))
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.option("end", "when the event ends, as YYYY-MM-DD HH:MM", str, required=False)
+@lightbulb.option("start", "when the event starts, as YYYY-MM-DD HH:MM", str, required=False)
 @lightbulb.option("event_name", "Name of the event", str)
 @lightbulb.option("event_link", "Link to facebook event", str)
 @lightbulb.command('addevent', 'start an event submission')
@@ -96,112 +257,209 @@ async def add_event(ctx: lightbulb.SlashContext):
         Line 1: qualifier
         Line 2: event name
     '''
-    print("add event")
-    prototype_channel = config.event_prototype_channel
+    guild = guild_of(ctx)
+    prototype_channel = guild.config.event_prototype_channel
     if "\n" in ctx.options.event_name:
         await ctx.respond("event name cannot contain newline \n aborting....")
-    await bot.rest.create_message(prototype_channel,
-                                  f"{new_event_qualifier}\n"
-                                  f"**{ctx.options.event_name}**\n{ctx.options.event_link} \n under construction, "
-                                  "Thank you for using \"Enigma Event Bot\"! Your event will be added shortly, "
-                                  "please reply with a description and a picture.")
     try:
-        with EventManager() as eventmanager:
-            eventmanager.add(Event(ctx.options.event_name, ctx.options.event_link, ctx.author.id))
+        start = parse_event_time(ctx.options.start, guild.timezone) if ctx.options.start else None
+        end = parse_event_time(ctx.options.end, guild.timezone) if ctx.options.end else None
+    except ValueError:
+        await ctx.respond("start and end have to look like 2024-09-30 18:00")
+        return
+    if start is not None and end is None:
+        end = start + DEFAULT_EVENT_DURATION
+    if start is not None and end <= start:
+        await ctx.respond("the event has to end after it starts")
+        return
+    new_event = Event(ctx.options.event_name, ctx.options.event_link, ctx.author.id, start=start, end=end)
+    try:
+        async with EventManager(ctx.guild_id) as eventmanager:
+            eventmanager.add(new_event)
     except DuplicateEventError as e:
         await ctx.respond(f'You already have an event with this name, please delete it or edit it')
+        return
+    guild.scheduler.schedule(new_event)
+    qualifier_message = await rest.run(message_bucket(prototype_channel),
+                                       partial(bot.rest.create_message, prototype_channel,
+                                               f"{new_event_qualifier}\n"
+                                               f"**{ctx.options.event_name}**\n{ctx.options.event_link} \n "
+                                               "under construction, Thank you for using \"Enigma Event Bot\"! "
+                                               "Your event will be added shortly, please reply with a description "
+                                               "and a picture."))
+    await guild.workflow.register(qualifier_message.id, new_event.uuid, WorkflowStage.describe)
 
 
 @bot.command
-@lightbulb.add_checks(lightbulb.has_roles(config.enigma_role_id))
-@lightbulb.option("event_name", "Name of the event", str)
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.option("event_name", "Name of the event", str, autocomplete=True)
 @lightbulb.command('deleteevent', 'delete an event submission')
 @lightbulb.implements(lightbulb.SlashCommand)
 async def delete_event(ctx: lightbulb.SlashContext):
-    print("delete event")
     try:
-        with EventManager() as eventmanager:
-            eventmanager.discard(ctx.options.event_name)
-            await ctx.respond(f'Event {ctx.options.event_name} deleted')
-    except DuplicateEventError as e:
+        # waits for a post or an archive of the event in progress instead of pulling the event from under it
+        async with EventManager(ctx.guild_id) as eventmanager, \
+                eventmanager.transaction(ctx.options.event_name) as transaction:
+            transaction.discard()
+        await guild_of(ctx).workflow.discard_event(transaction.event.uuid)
+        await ctx.respond(f'Event {ctx.options.event_name} deleted')
+    except EventNotFoundError as e:
         await ctx.respond('You do not have an event with this name')
 
 
+@delete_event.autocomplete("event_name")
+async def complete_event_name(option: hikari.AutocompleteInteractionOption,
+                              interaction: hikari.AutocompleteInteraction) -> list[str]:
+    """ suggests existing event names from the in-memory prefix index while the name is typed """
+    if interaction.guild_id is None or await guilds.get(interaction.guild_id) is None:
+        return []
+    async with EventManager(interaction.guild_id) as eventmanager:
+        return eventmanager.complete_name(str(option.value or ""))
+
+
 @bot.command
-@lightbulb.add_checks(lightbulb.has_roles(config.enigma_role_id))
+@lightbulb.add_checks(is_event_admin)
 @lightbulb.command('list-unsubmitted-events', 'list all unsubmitted events')
 @lightbulb.implements(lightbulb.SlashCommand)
 async def list_unsubmitted_events(ctx: lightbulb.SlashContext):
-    print("list unsubmitted events")
-    with EventManager() as eventmanager:
+    async with EventManager(ctx.guild_id) as eventmanager:
         events = eventmanager.get_in_progress_events()
-        await ctx.respond(f'Unsubmitted events:')
-        for event in events:
-            await ctx.respond(event)
+    await respond_with_events(ctx, 'Unsubmitted events:', events)
 
 
 @bot.command
-@lightbulb.add_checks(lightbulb.has_roles(config.enigma_role_id))
+@lightbulb.add_checks(is_event_admin)
 @lightbulb.command('list-submitted-events', 'list all submitted events')
 @lightbulb.implements(lightbulb.SlashCommand)
 async def list_submitted_events(ctx: lightbulb.SlashContext):
-    print("list submitted events")
-    with EventManager() as eventmanager:
+    async with EventManager(ctx.guild_id) as eventmanager:
         events = eventmanager.get_submitted_events()
-        await ctx.respond(f'Submitted events:')
-        for event in events:
-            await ctx.respond(event)
+    await respond_with_events(ctx, 'Submitted events:', events)
+
+
+async def respond_with_events(ctx: lightbulb.SlashContext, heading: str, events: Iterable[Event]) -> None:
+    """ lists the events as embeds, packed into as few messages as possible """
+    embeds = [event_embed(event) for event in sorted(events, key=lambda event: event.name)]
+    pages = paginate_embeds(embeds)
+    if not pages:
+        await ctx.respond(f'{heading} none')
+        return
+    await ctx.respond(heading, embeds=pages[0])
+    for page in pages[1:]:
+        await ctx.respond(embeds=page)
 
 
 @bot.command
-@lightbulb.add_checks(lightbulb.has_roles(config.enigma_role_id))
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.command('events', 'browse events')
+@lightbulb.implements(lightbulb.SlashCommandGroup)
+async def events_group(ctx: lightbulb.SlashContext):
+    pass
+
+
+@events_group.child
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.option("prefix", "only events whose name starts with this", str, required=False, default="")
+@lightbulb.option("organizer", "only events organized by this member", hikari.User, required=False)
+@lightbulb.option("state", "only events in this state", str, required=False,
+                  choices=[state.value for state in EventState])
+@lightbulb.command('list', 'list events page by page')
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def list_events(ctx: lightbulb.SlashContext):
+    await respond_with_page(ctx, "Events", query_from_options(ctx, prefix=ctx.options.prefix))
+
+
+@events_group.child
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.option("organizer", "only events organized by this member", hikari.User, required=False)
+@lightbulb.option("state", "only events in this state", str, required=False,
+                  choices=[state.value for state in EventState])
+@lightbulb.option("text", "text the event name contains", str)
+@lightbulb.command('search', 'search events by name')
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def search_events(ctx: lightbulb.SlashContext):
+    await respond_with_page(ctx, f'Events containing "{ctx.options.text}"',
+                            query_from_options(ctx, substring=ctx.options.text))
+
+
+@events_group.child
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.option("prefix", "only events whose name starts with this", str, required=False, default="")
+@lightbulb.command('archive', 'list events that are over, the most recent first')
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def list_archived_events(ctx: lightbulb.SlashContext):
+    prefix = ctx.options.prefix.casefold()
+    archive = guild_of(ctx).archive
+    archived = [event for event in await asyncio.to_thread(archive.read) if event.name.casefold().startswith(prefix)]
+    lines = [f"[{event.name}]({event.link}) · <t:{int(event.end.timestamp())}:d> · <@{event.organizer_id}>"
+             for event in archived[:ARCHIVE_PAGE_SIZE]]
+    embed = hikari.Embed(title="Archived events", description="\n".join(lines) or "no events found", color=0x00ff00)
+    await ctx.respond(embed=embed, flags=hikari.MessageFlag.EPHEMERAL)
+
+
+def query_from_options(ctx: lightbulb.SlashContext, prefix: str = "", substring: str = "") -> EventQuery:
+    state = EventState(ctx.options.state) if ctx.options.state else None
+    organizer_id = ctx.options.organizer.id if ctx.options.organizer else None
+    return EventQuery(state, organizer_id, prefix, substring)
+
+
+async def respond_with_page(ctx: lightbulb.SlashContext, title: str, query: EventQuery) -> None:
+    view = eventviews.EventPageView(ctx.guild_id, title, query)
+    await view.load_page()
+    response = await ctx.respond(embed=view.embed(), components=view, flags=hikari.MessageFlag.EPHEMERAL)
+    await view.start(await response.message())
+
+
+@bot.command
+@lightbulb.add_checks(is_event_admin)
+@lightbulb.command('botstats', 'show where the bot spends its time')
+@lightbulb.implements(lightbulb.SlashCommand)
+async def bot_stats(ctx: lightbulb.SlashContext):
+    summary = registry.summary() or "nothing measured yet"
+    # stay below Discord's message length limit
+    await ctx.respond(f"```\n{summary[:1900]}\n```", flags=hikari.MessageFlag.EPHEMERAL)
+
+
+@bot.command
+@lightbulb.add_checks(is_event_admin)
 @lightbulb.command("update_years", 'Add 5 subsequent years as roles')
 @lightbulb.implements(lightbulb.SlashCommand)
 async def update_year(ctx: lightbulb.SlashContext):
-    # THIS LOOP IS ONLY FOR TESTING
-    # for role in await bot.rest.fetch_roles(config.guild_id):
-    #    if role.name.startswith("20"):
-    #        await bot.rest.delete_role(role=role, guild=config.guild_id)
-
+    guild = guild_of(ctx)
     years = [datetime.date.today().year - i for i in range(6)]
-    for year, role in year_roles.items():
-        if year not in years:
-            await bot.rest.delete_role(role, config.guild_id)
-            await ctx.respond(f"deleted role: {year}")
-            del year_roles[year]
-
-    for year in years:
-        if year not in year_roles.keys():
-            created_role = await bot.rest.create_role(name=str(year), guild=config.guild_id, color=0x00ff00, hoist=True,
-                                                      mentionable=True)
-            await ctx.respond(f"added role: {year}")
-            year_roles[year] = created_role
-    await ctx.respond("done")
-    role_view = RoleView(year_roles)
-    message = await bot.rest.create_message(config.role_channel, components=role_view,
-                                            content="React to this message to get your year role!")
-    await role_view.start(message)
-
-
-def is_reply_action(reply_qualifier: str, event: hikari.GuildMessageCreateEvent) -> (bool, str):
-    """ returns a tuple of (is_reply, reply_content) reply_content is without the reply qualifier"""
-    if not event.is_human or event.message.content is None:
-        return False, None
-    if event.channel_id is config.event_prototype_channel or event.message.type is not event.message.type.REPLY:
-        print("not a reply")
-        return False, None
-    if event.message.referenced_message.author.id != bot.get_me().id:
-        print("not a reply to me")
-        print(event.message.referenced_message.author.id)
-        print(bot.get_me().id)
-        return False, None
-    if event.message.referenced_message.content is None:
-        print("no content")
-        return False, None
-    if not event.message.referenced_message.content.startswith(reply_qualifier):
-        return False, None
-    return True, event.message.referenced_message.content.removeprefix(reply_qualifier + "\n").strip()
+    try:
+        stale_years, missing_years = await guild.year_roles.update(rest, bot.rest, ctx.guild_id, years)
+    except YearRoleUpdateError as error:
+        logger.warning("%s", error, exc_info=next(iter(error.failed.values())))
+        stale_years, missing_years = error.deleted, error.created
+        await ctx.respond(f"deleted roles: {stale_years}\nadded roles: {missing_years}\n"
+                          f"could not update the roles of {sorted(error.failed)}, please try again")
+    else:
+        await ctx.respond(f"deleted roles: {stale_years}\nadded roles: {missing_years}\ndone")
+    if stale_years or missing_years or guild.year_roles.menu is None:
+        await show_role_menu(guild)
+
+
+async def show_role_menu(guild: GuildState) -> None:
+    """ edits the role menu to offer the current years, posting it if it was never posted or has been deleted """
+    year_roles = guild.year_roles
+    role_channel = guild.config.role_channel
+    async with guild.role_menu_lock:
+        view = RoleView(guilds.year_roles, guild_id=guild.config.guild_id)
+        if year_roles.menu is not None:
+            channel_id, message_id = year_roles.menu
+            try:
+                await rest.run(message_bucket(channel_id),
+                               partial(bot.rest.edit_message, channel_id, message_id, components=view))
+                return
+            except hikari.NotFoundError:
+                logger.info("role menu was deleted, posting a new one")
+        message = await rest.run(message_bucket(role_channel),
+                                 partial(bot.rest.create_message, role_channel, components=view,
+                                         content="React to this message to get your year role!"))
+        await year_roles.set_menu(role_channel, message.id)
 
 
 if __name__ == '__main__':
-    bot.run()
+    # with shard_ids set, this process runs only those shards, and only starts the guilds Discord places on them
+    bot.run(shard_count=config.shard_count, shard_ids=config.shard_ids)
@@ -1,5 +1,32 @@
 from dataclasses import dataclass
 import json
+import os
+
+from events import EVENTS_FILE_PATH
+
+# several bot processes, e.g. one per group of shards, can be started with a config file each
+CONFIG_FILE_NAME = os.environ.get("EVENT_BOT_CONFIG", "config/config.json")
+
+
+@dataclass
+class GuildConfig:
+    """ Settings of one guild the bot serves """
+    guild_id: int
+    event_channel: int
+    enigma_role_id: int
+    role_channel: int
+    event_prototype_channel: int
+    timezone: str
+    reminder_minutes: int
+    # the guild's events, workflow, year roles and archive are kept in here
+    state_path: str
+
+    @staticmethod
+    def from_dict(guild_id: int, data: dict, defaults: dict, state_path: str) -> 'GuildConfig':
+        return GuildConfig(guild_id, data["event_channel_id"], data["enigma_role_id"], data["role_channel_id"],
+                           data["event_prototype_channel_id"],
+                           data.get("timezone", defaults.get("timezone", "Europe/Copenhagen")),
+                           data.get("reminder_minutes", defaults.get("reminder_minutes", 60)), state_path)
 
 
 @dataclass
@@ -8,12 +35,57 @@ class ConfigManager:
     event_channel: int
     enigma_role_id: int
 
-    def __init__(self):
-        with open('config/config.json') as config_file:
+    def __init__(self, path: str = CONFIG_FILE_NAME):
+        with open(path) as config_file:
             self.config = json.load(config_file)
         self.token = self.config["token"]
         self.event_channel = self.config["event_channel_id"]
         self.enigma_role_id = self.config["enigma_role_id"]
         self.guild_id = self.config["enigma_discord_id"]
         self.role_channel = self.config["role_channel_id"]
-        self.event_prototype_channel = self.config["event_prototype_channel_id"]
\ No newline at end of file
+        self.event_prototype_channel = self.config["event_prototype_channel_id"]
+        self.event_storage = self.config.get("event_storage", "journal")
+        self.rsvp_update_interval = self.config.get("rsvp_update_interval_seconds", 2.0)
+        self.log_level = self.config.get("log_level", "INFO")
+        self.metrics_port = self.config.get("metrics_port", None)
+        self.member_events = self.config.get("member_events", False)
+        self.timezone = self.config.get("timezone", "Europe/Copenhagen")
+        self.reminder_minutes = self.config.get("reminder_minutes", 60)
+        # None lets Discord recommend a shard count and runs all shards in this process
+        self.shard_count = self.config.get("shard_count", None)
+        self.shard_ids = self.config.get("shard_ids", None)
+        if self.shard_ids is not None and self.shard_count is None:
+            # which shards a process runs only means something once they are counted
+            raise ValueError(f"{path}: shard_ids needs shard_count")
+        # every further guild has a file named after its id in here
+        self.guilds_path = os.path.join(os.path.dirname(path), "guilds")
+        self.guilds: dict[int, GuildConfig | None] = {}
+
+    def guild(self, guild_id: int) -> GuildConfig | None:
+        """ the settings of a guild, read the first time the guild is used, or None if the bot isn't set up there.
+
+        Guild files added while the bot runs are picked up after a restart.
+        """
+        if guild_id in self.guilds:
+            return self.guilds[guild_id]
+        if guild_id == self.guild_id:
+            guild_config = GuildConfig.from_dict(guild_id, self.config, self.config, self.state_path(guild_id))
+        else:
+            guild_config = self._load_guild(guild_id)
+        self.guilds[guild_id] = guild_config
+        return guild_config
+
+    def _load_guild(self, guild_id: int) -> GuildConfig | None:
+        path = os.path.join(self.guilds_path, f"{guild_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as guild_file:
+            data = json.load(guild_file)
+        return GuildConfig.from_dict(guild_id, data, self.config, self.state_path(guild_id))
+
+    def state_path(self, guild_id: int) -> str:
+        """ the folder a guild's state is kept in, whether the guild is configured or not """
+        if guild_id == self.guild_id:
+            # the guild configured in the main file keeps its state where it always was
+            return EVENTS_FILE_PATH
+        return f"{EVENTS_FILE_PATH}/guilds/{guild_id}"
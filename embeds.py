@@ -0,0 +1,56 @@
+from collections.abc import Callable
+
+import hikari
+
+import events
+from events import Event
+
+AUTHOR_NAME = "Enigma"
+AUTHOR_ICON = "https://avatars.githubusercontent.com/u/112754344?s=200&v=4"
+FOOTER = "Syddanske Softwarestuderendes Fagråd"
+COLOR = 0x00ff00
+
+
+def build_event_embed(event: Event) -> hikari.Embed:
+    embed = hikari.Embed(title=event.name, description=str(event.description), url=event.link, color=COLOR)
+    embed.set_image(event.image_link)
+    if event.start is not None:
+        when = f"<t:{int(event.start.timestamp())}:F>"
+        if event.end is not None:
+            when += f" - <t:{int(event.end.timestamp())}:t>"
+        embed.add_field("When", when)
+    embed.set_author(name=AUTHOR_NAME, icon=AUTHOR_ICON)
+    embed.set_footer(text=FOOTER)
+    return embed
+
+
+class EmbedCache:
+    """ Rendered embeds keyed by event uuid, together with the event version they were rendered from.
+
+    A changed event has a new version and is rendered again, and EventManager invalidates the entry as soon as the
+    description or image link changes or the event is deleted. The cached embeds are shared, so callers must not
+    modify them.
+    """
+
+    def __init__(self, render: Callable[[Event], hikari.Embed] = build_event_embed) -> None:
+        self.render = render
+        self.entries: dict[int, tuple[int, hikari.Embed]] = {}
+
+    def get(self, event: Event) -> hikari.Embed:
+        entry = self.entries.get(event.uuid)
+        if entry is not None and entry[0] == event.version:
+            return entry[1]
+        embed = self.render(event)
+        self.entries[event.uuid] = (event.version, embed)
+        return embed
+
+    def invalidate(self, event: Event) -> None:
+        self.entries.pop(event.uuid, None)
+
+
+embed_cache = EmbedCache()
+events.content_listeners.append(embed_cache.invalidate)
+
+
+def event_embed(event: Event) -> hikari.Embed:
+    return embed_cache.get(event)
@@ -0,0 +1,44 @@
+from collections.abc import Iterator
+import json
+import os
+
+from events import EVENTS_FILE_PATH, Event, append_records
+
+ARCHIVE_FILE_NAME = f'{EVENTS_FILE_PATH}/archive.jsonl'
+
+
+class EventArchive:
+    """ Cold partition for events that are over.
+
+    Archived events leave the resident store, so it only holds current events however long the bot runs. They are
+    appended to a JSON lines file that is only read when someone asks for the archive.
+    """
+
+    def __init__(self, path: str = ARCHIVE_FILE_NAME) -> None:
+        self.path = path
+
+    def append(self, event: Event) -> None:
+        """ blocking, call it off the event loop """
+        # a line torn by a crash is skipped when reading, as long as the next event starts on a line of its own
+        append_records([event.to_dict()], self.path, after_torn_line=True)
+
+    def read(self) -> list[Event]:
+        """ blocking, returns the archived events from the most recently archived one back """
+        if not os.path.exists(self.path):
+            return []
+        # an event archived twice, after a crash between archiving and removing it, is listed once
+        events: dict[int, Event] = {}
+        for data in read_lines(self.path):
+            event = Event.from_dict(data)
+            events.pop(event.uuid, None)
+            events[event.uuid] = event
+        return list(reversed(events.values()))
+
+
+def read_lines(path: str) -> Iterator[dict]:
+    with open(path) as archive_file:
+        for line in archive_file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
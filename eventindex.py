@@ -0,0 +1,136 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+
+TRIGRAM_LENGTH = 3
+
+# names are ordered case-insensitively, the name itself breaks ties between names that only differ in case
+NameKey = tuple[str, str]
+
+
+def name_key(name: str) -> NameKey:
+    return name.casefold(), name
+
+
+class SortedNameIndex:
+    """ Event names in case-insensitive order, for prefix lookups and cursor based pages """
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self.keys: list[NameKey] = sorted(name_key(name) for name in names)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def count(self, prefix: str = '') -> int:
+        """ how many names start with `prefix`, without visiting them """
+        prefix = prefix.casefold()
+        if not prefix:
+            return len(self.keys)
+        # every folded name starting with the prefix sorts below the prefix followed by the highest code point
+        return bisect_left(self.keys, (prefix + chr(0x10ffff), '')) - bisect_left(self.keys, (prefix, ''))
+
+    def add(self, name: str) -> None:
+        insort(self.keys, name_key(name))
+
+    def remove(self, name: str) -> None:
+        key = name_key(name)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+
+    def iterate(self, prefix: str = '', after: NameKey | None = None) -> Iterator[str]:
+        """ yields the names starting with `prefix` in order, beginning right after the `after` cursor """
+        prefix = prefix.casefold()
+        position = bisect_left(self.keys, (prefix, ''))
+        if after is not None:
+            position = max(position, bisect_right(self.keys, after))
+        for folded, name in self.keys[position:]:
+            if not folded.startswith(prefix):
+                return
+            yield name
+
+
+class TrigramIndex:
+    """ Maps every three letter sequence in an event name to the names containing it, for substring search """
+
+    def __init__(self) -> None:
+        self.names: defaultdict[str, set[str]] = defaultdict(set)
+
+    def add(self, name: str) -> None:
+        for trigram in trigrams(name):
+            self.names[trigram].add(name)
+
+    def remove(self, name: str) -> None:
+        for trigram in trigrams(name):
+            names = self.names.get(trigram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.names[trigram]
+
+    def candidates(self, substring: str) -> set[str]:
+        """ names containing every trigram of `substring`, which needs to be at least TRIGRAM_LENGTH long """
+        candidates: set[str] | None = None
+        # intersecting the rarest trigrams first keeps the intermediate sets small
+        for names in sorted((self.names.get(trigram, set()) for trigram in trigrams(substring)), key=len):
+            candidates = set(names) if candidates is None else candidates & names
+            if not candidates:
+                break
+        return candidates or set()
+
+
+def trigrams(text: str) -> set[str]:
+    text = text.casefold()
+    return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class PrefixTrie:
+    """ Event names by case-insensitive prefix, for autocompleting names as they are typed """
+
+    def __init__(self) -> None:
+        self.root = TrieNode()
+
+    def add(self, name: str) -> None:
+        node = self.root
+        for character in name.casefold():
+            node = node.children.setdefault(character, TrieNode())
+        node.names.add(name)
+
+    def remove(self, name: str) -> None:
+        path = [self.root]
+        folded = name.casefold()
+        for character in folded:
+            node = path[-1].children.get(character)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].names.discard(name)
+        # prune the branch that no longer leads to a name
+        for character, parent, node in zip(reversed(folded), reversed(path[:-1]), reversed(path[1:])):
+            if node.names or node.children:
+                break
+            del parent.children[character]
+
+    def complete(self, prefix: str, limit: int = 25) -> list[str]:
+        """ returns the first `limit` names starting with `prefix` in case-insensitive order """
+        node = self.root
+        for character in prefix.casefold():
+            node = node.children.get(character)
+            if node is None:
+                return []
+        # depth first in character order stops as soon as enough names are found, however many share the prefix
+        names: list[str] = []
+        stack = [node]
+        while stack and len(names) < limit:
+            node = stack.pop()
+            names.extend(sorted(node.names))
+            stack.extend(node.children[character] for character in sorted(node.children, reverse=True))
+        return names[:limit]
+
+
+class TrieNode:
+    __slots__ = ('children', 'names')
+
+    def __init__(self) -> None:
+        self.children: dict[str, TrieNode] = {}
+        self.names: set[str] = set()
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+from events import EVENTS_FILE_BASE_NAME, EVENTS_FILE_NAME, EVENTS_FILE_PATH, EventStorage, EventStore, \
+    append_records, load_events, write_snapshot
+
+JOURNAL_FILE_BASE_NAME = 'events.journal'
+JOURNAL_FILE_NAME = f'{EVENTS_FILE_PATH}/{JOURNAL_FILE_BASE_NAME}'
+
+
+class EventJournal(EventStorage):
+    """ Storage backend that appends one record per mutation and periodically compacts into a snapshot.
+
+    The snapshot is the regular events file, and the plain JSON backend replays a journal it finds next to it before
+    taking over, so switching between the two needs no migration. While a compaction runs the journal it covers is
+    kept next to the live journal with a `.compacting` suffix; replaying records is idempotent, so it is safe to
+    replay it on top of either snapshot. The compaction builds the new snapshot from the old one and that journal on
+    its own thread, so the resident store is never serialized on the event loop.
+    """
+
+    def __init__(self, snapshot_path: str = EVENTS_FILE_NAME, journal_path: str = JOURNAL_FILE_NAME,
+                 compact_after: int = 500) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compacting_path = f'{journal_path}.compacting'
+        self.compact_after = compact_after
+        self.records_since_snapshot = 0
+        self.compaction: threading.Thread | None = None
+
+    @classmethod
+    def in_directory(cls, directory: str) -> 'EventJournal':
+        return cls(f'{directory}/{EVENTS_FILE_BASE_NAME}', f'{directory}/{JOURNAL_FILE_BASE_NAME}')
+
+    def load(self) -> EventStore:
+        store = EventStore(load_events(self.snapshot_path))
+        journals = [path for path in (self.compacting_path, self.journal_path) if os.path.exists(path)]
+        for path in journals:
+            for record in read_journal(path):
+                store.apply(record)
+        # folding the replayed tail into the snapshot also drops a record torn by a crash, so new records are
+        # never appended after it
+        if store.reassigned_uuids or journals:
+            self.compact(store)
+        return store
+
+    def prepare(self, store: EventStore, records: list[dict]) -> tuple[list[dict], bool]:
+        """ runs on the event loop; the records are already copies, so this only decides whether to compact """
+        self.records_since_snapshot += len(records)
+        compact = self.records_since_snapshot >= self.compact_after and not self._compacting()
+        if compact:
+            self.records_since_snapshot = 0
+        return records, compact
+
+    def write(self, prepared: tuple[list[dict], bool]) -> None:
+        records, compact = prepared
+        append_records(records, self.journal_path)
+        if compact:
+            # the snapshot covers everything appended so far, later writes land in a fresh journal that is replayed
+            # on top of it
+            self._rotate()
+            self.compaction = threading.Thread(target=self._compact_rotated, daemon=True)
+            self.compaction.start()
+
+    def compact(self, store: EventStore) -> None:
+        """ folds every journal replayed into `store` into the snapshot, so new records start a fresh journal """
+        write_snapshot([event.to_dict() for event in store], self.snapshot_path)
+        self.records_since_snapshot = 0
+        # the live journal goes as well, even next to an interrupted compaction, since it may end in a torn record
+        for path in (self.compacting_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _compacting(self) -> bool:
+        return self.compaction is not None and self.compaction.is_alive()
+
+    def _rotate(self) -> None:
+        if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+            os.replace(self.journal_path, self.compacting_path)
+
+    def _compact_rotated(self) -> None:
+        """ folds the rotated journal into the snapshot, from the files alone """
+        store = EventStore(load_events(self.snapshot_path))
+        for record in read_journal(self.compacting_path):
+            store.apply(record)
+        write_snapshot([event.to_dict() for event in store], self.snapshot_path)
+        os.remove(self.compacting_path)
+
+
+def read_journal(path: str) -> list[dict]:
+    records = []
+    with open(path) as journal_file:
+        for line in journal_file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # a crash while appending can only tear the last record
+                break
+    return records
@@ -1,12 +1,24 @@
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
-from collections.abc import MutableSet
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator, MutableSet
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
+from datetime import datetime
 from enum import Enum
+import heapq
 import json
-import re
+import logging
+from typing import Any
 import uuid
+import weakref
 
-from utils import find
+from eventindex import TRIGRAM_LENGTH, NameKey, PrefixTrie, SortedNameIndex, TrigramIndex, name_key
+from metrics import timed
+
+logger = logging.getLogger(__name__)
 
 
 class EventState(Enum):
@@ -22,6 +34,10 @@ class EventNotFoundError(Exception):
     pass
 
 
+class EventConflictError(Exception):
+    pass
+
+
 @dataclass
 class Event:
     name: str
@@ -29,8 +45,19 @@ class Event:
     organizer_id: int
     state: EventState = field(default=EventState.in_progress)
     description: str | None = field(default=None)
-    uuid: int = field(default=uuid.uuid4().int)
+    uuid: int = field(default_factory=lambda: uuid.uuid4().int)
     image_link: str | None = field(default=None)
+    attendees: set[int] = field(default_factory=set)
+    # where the event was posted, so its RSVP buttons can be matched back to it after a restart
+    channel_id: int | None = field(default=None)
+    message_id: int | None = field(default=None)
+    # timezone aware, events without an end are never archived
+    start: datetime | None = field(default=None)
+    end: datetime | None = field(default=None)
+    # whether the attendees were reminded that the event starts soon
+    reminded: bool = field(default=False)
+    # bumped on every change in this process, used to detect edits based on a stale read
+    version: int = field(default=0, compare=False)
 
     def __eq__(self, other: 'Event') -> bool:
         return self.name == other.name
@@ -44,7 +71,14 @@ class Event:
         state = EventState(data['state'])
         image_link = data.get('image_link', None)
         description = data.get('description', None)
-        return Event(event_name, event_link, organizer_id, state, description, image_link=image_link)
+        attendees = set(data.get('attendees', []))
+        channel_id = data.get('channel_id', None)
+        message_id = data.get('message_id', None)
+        start = parse_datetime(data.get('start', None))
+        end = parse_datetime(data.get('end', None))
+        reminded = data.get('reminded', False)
+        return Event(event_name, event_link, organizer_id, state, description, uuid, image_link, attendees,
+                     channel_id, message_id, start, end, reminded)
 
     def to_dict(self) -> dict:
         return {
@@ -54,7 +88,13 @@ class Event:
             'organizer_id': self.organizer_id,
             'state': self.state.value,
             'image_link': self.image_link,
-            'description': self.description
+            'description': self.description,
+            'attendees': sorted(self.attendees),
+            'channel_id': self.channel_id,
+            'message_id': self.message_id,
+            'start': format_datetime(self.start),
+            'end': format_datetime(self.end),
+            'reminded': self.reminded
         }
 
     def __str__(self):
@@ -64,111 +104,606 @@ class Event:
         return id(self)
 
 
+def parse_datetime(text: str | None) -> datetime | None:
+    return None if text is None else datetime.fromisoformat(text)
+
+
+def format_datetime(moment: datetime | None) -> str | None:
+    return None if moment is None else moment.isoformat()
+
+
+@dataclass
+class EventQuery:
+    state: EventState | None = None
+    organizer_id: int | None = None
+    # matched case-insensitively against the event name
+    prefix: str = ''
+    substring: str = ''
+
+    def matches(self, event: Event) -> bool:
+        name = event.name.casefold()
+        return ((self.state is None or event.state is self.state)
+                and (self.organizer_id is None or event.organizer_id == self.organizer_id)
+                and name.startswith(self.prefix.casefold())
+                and self.substring.casefold() in name)
+
+
+# called with the event whenever its rendered content changes or it is removed, e.g. to drop cached renderings
+content_listeners: list[Callable[[Event], None]] = []
+
+
+class EventStore:
+    """ Process-resident copy of every event, indexed by name, uuid, state and organizer.
+
+    Every mutation is also queued as a journal record in `pending` until the storage backend commits it.
+    """
+
+    def __init__(self, events: Iterable[Event] = ()) -> None:
+        self.by_name: dict[str, Event] = {}
+        self.by_uuid: dict[int, Event] = {}
+        self.by_state: dict[EventState, set[Event]] = {state: set() for state in EventState}
+        self.by_organizer: defaultdict[int, set[Event]] = defaultdict(set)
+        self.by_message: dict[int, Event] = {}
+        self.names = SortedNameIndex()
+        # the names again, split by state and by organizer, so pages filtered by either walk only matching events
+        self.names_by_state: dict[EventState, SortedNameIndex] = {state: SortedNameIndex() for state in EventState}
+        self.names_by_organizer: dict[int, SortedNameIndex] = {}
+        self.trigrams = TrigramIndex()
+        self.prefixes = PrefixTrie()
+        self.pending: list[dict] = []
+        self.reassigned_uuids = False
+        for event in events:
+            self._index(event)
+
+    def __contains__(self, event: Event) -> bool:
+        return self.by_name.get(event.name) is event
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(list(self.by_name.values()))
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending)
+
+    def take_pending(self) -> list[dict]:
+        pending, self.pending = self.pending, []
+        return pending
+
+    def get(self, event_name: str) -> Event | None:
+        return self.by_name.get(event_name)
+
+    def search(self, query: EventQuery, after: NameKey | None = None, limit: int = 10) -> list[Event]:
+        """ returns up to `limit` events matching the query in name order, starting right after the `after` cursor.
+
+        Candidates come from whichever index holds the fewest for the query: the names with the prefix, those of the
+        state or organizer with the prefix, or the names containing the substring's trigrams. The sorted indexes are
+        walked from the cursor and stop once the page is full, so a page costs about as much as its size unless most
+        candidates are filtered out. Trigram candidates are an unordered set, only the page is picked out in order.
+        """
+        indexes = [self.names]
+        if query.state is not None:
+            indexes.append(self.names_by_state[query.state])
+        if query.organizer_id is not None:
+            if query.organizer_id not in self.names_by_organizer:
+                return []
+            indexes.append(self.names_by_organizer[query.organizer_id])
+        index = min(indexes, key=lambda index: index.count(query.prefix))
+        if len(query.substring) >= TRIGRAM_LENGTH:
+            candidates = self.trigrams.candidates(query.substring)
+            if len(candidates) < index.count(query.prefix):
+                matching = (self.by_name[name] for name in candidates if after is None or name_key(name) > after)
+                return heapq.nsmallest(limit, (event for event in matching if query.matches(event)),
+                                       key=lambda event: name_key(event.name))
+        events = []
+        for name in index.iterate(query.prefix, after):
+            event = self.by_name[name]
+            if query.matches(event):
+                events.append(event)
+                if len(events) == limit:
+                    break
+        return events
+
+    def add(self, event: Event) -> None:
+        self._index(event)
+        self.pending.append({'op': 'add', 'event': event.to_dict()})
+
+    def discard(self, event: Event) -> None:
+        self._unindex(event)
+        notify_content_listeners(event)
+        self.pending.append({'op': 'discard', 'name': event.name})
+
+    def set_event_description(self, event: Event, description: str) -> None:
+        event.description = description
+        event.version += 1
+        notify_content_listeners(event)
+        self.pending.append({'op': 'set_event_description', 'name': event.name, 'description': description})
+
+    def set_image_link(self, event: Event, image_link: str) -> None:
+        event.image_link = image_link
+        event.version += 1
+        notify_content_listeners(event)
+        self.pending.append({'op': 'set_image_link', 'name': event.name, 'image_link': image_link})
+
+    def submit_event(self, event: Event) -> None:
+        self._set_state(event, EventState.submitted)
+        self.pending.append({'op': 'submit_event', 'name': event.name})
+
+    def set_post(self, event: Event, channel_id: int, message_id: int) -> None:
+        self._set_post(event, channel_id, message_id)
+        self.pending.append({'op': 'set_post', 'name': event.name, 'channel_id': channel_id,
+                             'message_id': message_id})
+
+    def join_event(self, event: Event, user_id: int) -> None:
+        event.attendees.add(user_id)
+        self.pending.append({'op': 'join_event', 'name': event.name, 'user_id': user_id})
+
+    def leave_event(self, event: Event, user_id: int) -> None:
+        event.attendees.discard(user_id)
+        self.pending.append({'op': 'leave_event', 'name': event.name, 'user_id': user_id})
+
+    def mark_reminded(self, event: Event) -> None:
+        event.reminded = True
+        self.pending.append({'op': 'mark_reminded', 'name': event.name})
+
+    def apply(self, record: dict) -> None:
+        """ replays a journal record; replaying a record that is already reflected in the store is a no-op """
+        op = record['op']
+        if op == 'add':
+            event = Event.from_dict(record['event'])
+            existing = self.by_name.get(event.name)
+            if existing is not None:
+                self._unindex(existing)
+            self._index(event)
+            return
+        event = self.by_name.get(record['name'])
+        if event is None:
+            return
+        if op == 'discard':
+            self._unindex(event)
+        elif op == 'set_event_description':
+            event.description = record['description']
+            event.version += 1
+        elif op == 'set_image_link':
+            event.image_link = record['image_link']
+            event.version += 1
+        elif op == 'submit_event':
+            self._set_state(event, EventState.submitted)
+        elif op == 'set_post':
+            self._set_post(event, record['channel_id'], record['message_id'])
+        elif op == 'join_event':
+            event.attendees.add(record['user_id'])
+        elif op == 'leave_event':
+            event.attendees.discard(record['user_id'])
+        elif op == 'mark_reminded':
+            event.reminded = True
+        else:
+            raise ValueError(f'unknown journal operation {op!r}')
+
+    def _index(self, event: Event) -> None:
+        # events saved before uuids were generated per event all share the same one
+        if event.uuid in self.by_uuid:
+            event.uuid = uuid.uuid4().int
+            self.reassigned_uuids = True
+        if event.name not in self.by_name:
+            self.names.add(event.name)
+            self.trigrams.add(event.name)
+            self.prefixes.add(event.name)
+        self.by_name[event.name] = event
+        self.by_uuid[event.uuid] = event
+        self.by_state[event.state].add(event)
+        self.by_organizer[event.organizer_id].add(event)
+        self.names_by_state[event.state].add(event.name)
+        self.names_by_organizer.setdefault(event.organizer_id, SortedNameIndex()).add(event.name)
+        if event.message_id is not None:
+            self.by_message[event.message_id] = event
+
+    def _unindex(self, event: Event) -> None:
+        del self.by_name[event.name]
+        self.names.remove(event.name)
+        self.trigrams.remove(event.name)
+        self.prefixes.remove(event.name)
+        del self.by_uuid[event.uuid]
+        if event.message_id is not None:
+            del self.by_message[event.message_id]
+        self.by_state[event.state].discard(event)
+        self.names_by_state[event.state].remove(event.name)
+        organized = self.by_organizer[event.organizer_id]
+        organized.discard(event)
+        self.names_by_organizer[event.organizer_id].remove(event.name)
+        if not organized:
+            del self.by_organizer[event.organizer_id]
+            del self.names_by_organizer[event.organizer_id]
+
+    def _set_state(self, event: Event, state: EventState) -> None:
+        self.by_state[event.state].discard(event)
+        self.names_by_state[event.state].remove(event.name)
+        event.state = state
+        event.version += 1
+        self.by_state[state].add(event)
+        self.names_by_state[state].add(event.name)
+
+    def _set_post(self, event: Event, channel_id: int, message_id: int) -> None:
+        if event.message_id is not None:
+            del self.by_message[event.message_id]
+        event.channel_id = channel_id
+        event.message_id = message_id
+        self.by_message[message_id] = event
+
+
+def notify_content_listeners(event: Event) -> None:
+    for listener in content_listeners:
+        listener(event)
+
+
+class EventStorage(ABC):
+    """ Backend the resident EventStore is loaded from and committed to.
+
+    A commit is split in two: `prepare` runs on the caller's thread and copies whatever it needs out of the store,
+    `write` does the serialization and disk I/O on the writer thread.
+    """
+
+    @classmethod
+    @abstractmethod
+    def in_directory(cls, directory: str) -> 'EventStorage':
+        """ the backend keeping its files in `directory`, e.g. one per guild """
+
+    @abstractmethod
+    def load(self) -> EventStore:
+        pass
+
+    @abstractmethod
+    def prepare(self, store: EventStore, records: list[dict]) -> Any:
+        pass
+
+    @abstractmethod
+    def write(self, prepared: Any) -> None:
+        pass
+
+
+class JsonFileStorage(EventStorage):
+    """ Rewrites the whole events file on every commit.
+
+    `prepare` turns every event into a dict on the event loop, since the store keeps changing while the writer thread
+    serializes, so each flush costs the loop time in proportion to the number of events. That is a known limit of this
+    backend; the journal and SQLite backends only copy the new records.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = EVENTS_FILE_NAME if path is None else path
+
+    @classmethod
+    def in_directory(cls, directory: str) -> 'JsonFileStorage':
+        return cls(f'{directory}/{EVENTS_FILE_BASE_NAME}')
+
+    def load(self) -> EventStore:
+        # the journal backend only folds its journal into the events file now and then, so one it left behind is
+        # replayed and folded in here; imported here because eventjournal builds on this module
+        from eventjournal import JOURNAL_FILE_BASE_NAME, EventJournal
+        return EventJournal(self.path, os.path.join(os.path.dirname(self.path), JOURNAL_FILE_BASE_NAME)).load()
+
+    def prepare(self, store: EventStore, records: list[dict]) -> list[dict]:
+        return [event.to_dict() for event in store]
+
+    def write(self, prepared: list[dict]) -> None:
+        write_snapshot(prepared, self.path)
+
+
+FLUSH_DELAY = 0.05
+
+
+class EventPartition:
+    """ The events of one guild: the resident store, its storage backend and everything that serializes access to it.
+
+    Every load and write of a partition goes through its own single writer thread, so records reach the disk in the
+    order they were made whether they were committed from `with` or `async with`. Nothing is shared between
+    partitions, so guilds never wait for each other's locks or disk I/O.
+    """
+
+    def __init__(self, storage: EventStorage, name: str = 'default') -> None:
+        self.storage = storage
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'event-writer-{name}')
+        self.store: EventStore | None = None
+        self.load_lock = asyncio.Lock()
+        self.flush_task: asyncio.Task | None = None
+        # one lock per event name, dropped again once no transaction holds or waits for it
+        self.event_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def get_store(self) -> EventStore:
+        """ returns the resident event store, loading it from storage the first time it is needed """
+        if self.store is None:
+            self.store = self.writer.submit(self._load).result()
+        return self.store
+
+    async def get_store_async(self) -> EventStore:
+        """ like `get_store`, but loads the store on the writer thread instead of blocking the event loop """
+        async with self.load_lock:
+            if self.store is None:
+                self.store = await asyncio.get_running_loop().run_in_executor(self.writer, self._load)
+        return self.store
+
+    def _load(self) -> EventStore:
+        with timed('event_storage_seconds', operation='load'):
+            return self.storage.load()
+
+    def _write(self, prepared: Any) -> None:
+        with timed('event_storage_seconds', operation='write'):
+            self.storage.write(prepared)
+
+    def commit(self) -> None:
+        if self.store.dirty:
+            self.writer.submit(self._write, self.storage.prepare(self.store, self.store.take_pending())).result()
+
+    def schedule_flush(self) -> None:
+        """ writes the pending records in the background, coalescing every commit made within FLUSH_DELAY """
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def flush(self) -> None:
+        """ waits until every pending record has been written, e.g. before shutting down """
+        if self.flush_task is not None:
+            await self.flush_task
+        if self.store is not None and self.store.dirty:
+            await self._flush(delay=0)
+
+    async def _flush(self, delay: float = FLUSH_DELAY) -> None:
+        await asyncio.sleep(delay)
+        loop = asyncio.get_running_loop()
+        while self.store.dirty:
+            prepared = self.storage.prepare(self.store, self.store.take_pending())
+            await loop.run_in_executor(self.writer, self._write, prepared)
+
+    def lock(self, event_name: str) -> asyncio.Lock:
+        lock = self.event_locks.get(event_name)
+        if lock is None:
+            lock = self.event_locks[event_name] = asyncio.Lock()
+        return lock
+
+
+# the backend of each partition, by guild id; None is the partition of callers that don't name a guild
+_storage_factory: Callable[[int | None], EventStorage] = lambda guild_id: JsonFileStorage()
+_partitions: dict[int | None, EventPartition] = {}
+
+
+def configure_storage(factory: Callable[[int | None], EventStorage]) -> None:
+    """ selects the backend each guild's events are loaded from and committed to, before any of them are loaded """
+    global _storage_factory
+    _storage_factory = factory
+    _partitions.clear()
+
+
+def get_partition(guild_id: int | None = None) -> EventPartition:
+    """ returns the partition of a guild, created the first time the guild is used """
+    partition = _partitions.get(guild_id)
+    if partition is None:
+        partition = _partitions[guild_id] = EventPartition(_storage_factory(guild_id), str(guild_id))
+    return partition
+
+
+def get_store(guild_id: int | None = None) -> EventStore:
+    return get_partition(guild_id).get_store()
+
+
+async def get_store_async(guild_id: int | None = None) -> EventStore:
+    return await get_partition(guild_id).get_store_async()
+
+
+async def flush_events() -> None:
+    """ waits until the pending records of every partition have been written """
+    await asyncio.gather(*(partition.flush() for partition in list(_partitions.values())))
+
+
 class EventManager(MutableSet):
+    """ The events of one guild, or of the default partition when no guild is given """
+
+    def __init__(self, guild_id: int | None = None) -> None:
+        self.partition = get_partition(guild_id)
+
     def __enter__(self) -> 'EventManager':
-        self.events = load_events()
+        self.store = self.partition.get_store()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        save_events(self.events)
+        self.partition.commit()
+
+    async def __aenter__(self) -> 'EventManager':
+        self.store = await self.partition.get_store_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.store.dirty:
+            self.partition.schedule_flush()
+
+    @asynccontextmanager
+    async def transaction(self, event_name: str):
+        """ locks a single event and yields an EventTransaction that stages changes to it.
+
+        The staged changes are applied when the block exits without an exception. Transactions on different events
+        never wait for each other.
+        """
+        async with self.partition.lock(event_name):
+            transaction = EventTransaction(self, self[event_name])
+            yield transaction
+            transaction.commit()
 
     def __contains__(self, event: Event) -> bool:
-        return event in self.events
+        return event in self.store
 
     def __iter__(self):
-        return iter(self.events)
+        return iter(self.store)
 
     def __len__(self) -> int:
-        return len(self.events)
+        return len(self.store)
 
     def __getitem__(self, event_name: str) -> Event:
-        matches_event = lambda event: event.name == event_name
-        event = find(self.events, matches_event)
+        event = self.store.get(event_name)
         if event is not None:
             return event
         else:
             raise EventNotFoundError()
 
     def add(self, event: Event):
-        try:
-            self[event.name]
-        except EventNotFoundError:
-            self.events.add(event)
-        else:
+        if self.store.get(event.name) is not None:
             raise DuplicateEventError()
-
-    def edit_event(self, event_name: str, user_id: int, event_link: str):
-        try:
-            self.remove(event_name)
-        except EventNotFoundError:
-            pass
-
-        self.add(Event(event_name, event_link, user_id))
+        self.store.add(event)
 
     def discard(self, event_name: str):
         event = self[event_name]
-        return self.events.discard(event)
-
-    def remove(self, event_name: str) -> None:
-        event = self[event_name]
-        self.events.remove(event)
+        self.store.discard(event)
 
     def set_event_description(self, event_name: str, event_description: str):
         event = self[event_name]
-        event.description = event_description
+        self.store.set_event_description(event, event_description)
 
     def set_image_link(self, event_name: str, image_link: str):
         event = self[event_name]
-        event.image_link = image_link
+        self.store.set_image_link(event, image_link)
 
     def submit_event(self, event_name: str):
-        print("submitting event")
+        logger.debug("submitting event %s", event_name)
+        event = self[event_name]
+        self.store.submit_event(event)
+
+    def set_post(self, event_name: str, channel_id: int, message_id: int):
         event = self[event_name]
-        event.state = EventState.submitted
+        self.store.set_post(event, channel_id, message_id)
+
+    def join_event(self, event: Event, user_id: int) -> bool:
+        """ returns False if the user already attends the event """
+        if user_id in event.attendees:
+            return False
+        self.store.join_event(event, user_id)
+        return True
+
+    def leave_event(self, event: Event, user_id: int) -> bool:
+        """ returns False if the user does not attend the event """
+        if user_id not in event.attendees:
+            return False
+        self.store.leave_event(event, user_id)
+        return True
+
+    def mark_reminded(self, event: Event) -> None:
+        self.store.mark_reminded(event)
+
+    def get_by_uuid(self, event_uuid: int) -> Event:
+        event = self.store.by_uuid.get(event_uuid)
+        if event is None:
+            raise EventNotFoundError()
+        return event
+
+    def search(self, query: EventQuery, after: NameKey | None = None, limit: int = 10) -> list[Event]:
+        return self.store.search(query, after, limit)
+
+    def complete_name(self, prefix: str, limit: int = 25) -> list[str]:
+        return self.store.prefixes.complete(prefix, limit)
+
+    def get_by_message(self, message_id: int) -> Event:
+        event = self.store.by_message.get(message_id)
+        if event is None:
+            raise EventNotFoundError()
+        return event
 
     def get_in_progress_events(self) -> set[Event]:
-        return set(event for event in self.events if event.state == EventState.in_progress)
+        return set(self.store.by_state[EventState.in_progress])
 
     def get_submitted_events(self) -> set[Event]:
-        return set(event for event in self.events if event.state == EventState.submitted)
+        return set(self.store.by_state[EventState.submitted])
+
+
+class EventTransaction:
+    """ changes to one event, staged until the surrounding `EventManager.transaction` block exits """
+
+    def __init__(self, eventmanager: EventManager, event: Event) -> None:
+        self.eventmanager = eventmanager
+        self.event = event
+        self.version = event.version
+        self.changes: list[tuple[str, tuple]] = []
+
+    def set_event_description(self, event_description: str) -> None:
+        self.changes.append(('set_event_description', (event_description,)))
+
+    def set_image_link(self, image_link: str) -> None:
+        self.changes.append(('set_image_link', (image_link,)))
+
+    def submit_event(self) -> None:
+        self.changes.append(('submit_event', ()))
+
+    def set_post(self, channel_id: int, message_id: int) -> None:
+        self.changes.append(('set_post', (channel_id, message_id)))
+
+    def discard(self) -> None:
+        self.changes.append(('discard', ()))
+
+    def commit(self) -> None:
+        store = self.eventmanager.store
+        # only writers that bypass the lock can get here first
+        if store.get(self.event.name) is not self.event or self.event.version != self.version:
+            raise EventConflictError()
+        for method, args in self.changes:
+            getattr(store, method)(self.event, *args)
+        self.changes = []
+
 
 EVENTS_FILE_PATH = 'statefiles'
-EVENTS_FILE_NAME = f'{EVENTS_FILE_PATH}/events.json'
+EVENTS_FILE_BASE_NAME = 'events.json'
+EVENTS_FILE_NAME = f'{EVENTS_FILE_PATH}/{EVENTS_FILE_BASE_NAME}'
 
 
-def load_events() -> set[Event]:
-    if not os.path.exists(EVENTS_FILE_NAME):
+def load_events(path: str = EVENTS_FILE_NAME) -> set[Event]:
+    if not os.path.exists(path):
         return set()
 
-    with open(EVENTS_FILE_NAME) as events_file:
+    with open(path) as events_file:
         events_dict: set[dict] = json.load(events_file)
 
     events: set[Event] = set(Event.from_dict(event) for event in events_dict)
     return events
 
 
-def save_events(events: set[Event]):
-    # create parent folders if they don't exist
-    os.makedirs(EVENTS_FILE_PATH, exist_ok=True)
-    with open(EVENTS_FILE_NAME, 'w+') as events_file:
-        json.dump([event.to_dict() for event in events], events_file, indent=4)
-
+def save_events(events: Iterable[Event]):
+    write_snapshot([event.to_dict() for event in events])
 
-if __name__ == '__main__':
-    pattern = re.compile(r"^<@\d+> post name:(?P<event_name>.*?)$")
-    match = pattern.match("<@1101475630807253002> post name:IT DAY!!! 2023")
-    if match is not None:
-        print(match.group("event_name"))
-    import requests
 
-    url = 'https://avatars.githubusercontent.com/u/112754344?s=200&v=4'
-    response = requests.get(url)
+def write_snapshot(events: list[dict] | dict, path: str = EVENTS_FILE_NAME, json_lines: bool = False):
+    """ writes the events to a temporary file and swaps it in, so a crash never leaves a half written file.
 
-    if response.status_code == 200:
-        content_type = response.headers['content-type']
-        if 'image' in content_type:
-            print('This is a valid image URL.')
+    With `json_lines` a list is written one record per line, in the format `append_records` adds to.
+    """
+    # create parent folders if they don't exist
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as events_file:
+        if json_lines:
+            events_file.writelines(json.dumps(record) + '\n' for record in events)
         else:
-            print('This is not an image URL.')
-    else:
-        print('Failed to retrieve the URL.')
+            json.dump(events, events_file, indent=4)
+        events_file.flush()
+        os.fsync(events_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def append_records(records: Iterable[dict], path: str, after_torn_line: bool = False) -> None:
+    """ appends the records to a JSON lines file and waits until they are on disk.
+
+    Readers skip a line torn by a crash; with `after_torn_line` the first record is moved to a line of its own if the
+    file doesn't end in a newline, for files that are appended to without being rewritten on startup.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    separator = '\n' if after_torn_line and not ends_with_newline(path) else ''
+    with open(path, 'a') as records_file:
+        records_file.write(separator)
+        records_file.writelines(json.dumps(record) + '\n' for record in records)
+        records_file.flush()
+        os.fsync(records_file.fileno())
+
+
+def ends_with_newline(path: str) -> bool:
+    """ also true for a missing or empty file """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, 'rb') as records_file:
+        records_file.seek(-1, os.SEEK_END)
+        return records_file.read(1) == b'\n'
+
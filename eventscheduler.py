@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime, timedelta, tzinfo
+from enum import Enum
+from functools import partial
+import heapq
+import itertools
+import logging
+import time
+
+import hikari
+
+from eventarchive import EventArchive
+from events import Event, EventManager, EventNotFoundError
+from eventviews import AttendeeCountUpdater, EventView
+from restqueue import RestExecutor, message_bucket
+from workflow import WorkflowTable
+
+# Discord's limit on the length of a message
+MAX_MESSAGE_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+
+class EventStep(Enum):
+    # ping the attendees `reminder_lead` before the event starts
+    remind = 'remind'
+    # close the RSVP buttons and move the event to the archive
+    end = 'end'
+
+
+class EventScheduler:
+    """ Runs the timed steps of a guild's events: reminding attendees before they start, and ending them.
+
+    Deadlines are kept in a min-heap and a single task sleeps until the earliest one, waking up early only when an
+    earlier deadline is scheduled, so nothing is polled. Entries are not removed when an event is deleted or
+    rescheduled, instead every step checks that the event still exists and is still due when it runs.
+    """
+
+    def __init__(self, guild_id: int, executor: RestExecutor, archive: EventArchive, workflow: WorkflowTable,
+                 updater: AttendeeCountUpdater, reminder_lead: timedelta) -> None:
+        self.guild_id = guild_id
+        self.executor = executor
+        self.archive = archive
+        self.workflow = workflow
+        self.updater = updater
+        self.reminder_lead = reminder_lead
+        # (deadline as a unix timestamp, tie breaker, step, event uuid)
+        self.deadlines: list[tuple[float, int, EventStep, int]] = []
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    async def start(self, rest: hikari.api.RESTClient) -> None:
+        """ schedules the steps of every stored event, steps that came due while the bot was down run right away """
+        async with EventManager(self.guild_id) as eventmanager:
+            for event in eventmanager:
+                self.schedule(event)
+        self.task = asyncio.get_running_loop().create_task(self._run(rest))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def schedule(self, event: Event) -> None:
+        if event.start is not None and not event.reminded:
+            self._push(self.reminder_time(event), EventStep.remind, event.uuid)
+        if event.end is not None:
+            self._push(event.end.timestamp(), EventStep.end, event.uuid)
+
+    def reminder_time(self, event: Event) -> float:
+        return (event.start - self.reminder_lead).timestamp()
+
+    def _push(self, deadline: float, step: EventStep, event_uuid: int) -> None:
+        if not self.deadlines or deadline < self.deadlines[0][0]:
+            self.wakeup.set()
+        heapq.heappush(self.deadlines, (deadline, next(self.counter), step, event_uuid))
+
+    async def _run(self, rest: hikari.api.RESTClient) -> None:
+        while True:
+            self.wakeup.clear()
+            if not self.deadlines:
+                await self.wakeup.wait()
+                continue
+            delay = self.deadlines[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            deadline, _, step, event_uuid = heapq.heappop(self.deadlines)
+            try:
+                if step is EventStep.remind:
+                    await self._remind(rest, event_uuid, deadline)
+                else:
+                    await self._end(rest, event_uuid, deadline)
+            except Exception:
+                logger.exception("could not %s event %s", step.value, event_uuid)
+
+    async def _remind(self, rest: hikari.api.RESTClient, event_uuid: int, deadline: float) -> None:
+        async with EventManager(self.guild_id) as eventmanager:
+            try:
+                event = eventmanager.get_by_uuid(event_uuid)
+            except EventNotFoundError:
+                return
+            if event.reminded or event.start is None or self.reminder_time(event) != deadline:
+                return
+            # nobody could sign up for an event that was never posted, and a late reminder is no use
+            if event.message_id is None or not event.attendees or event.start.timestamp() < time.time():
+                return
+            # marked before sending, a reminder lost to a crash is better than one sent twice
+            eventmanager.mark_reminded(event)
+        heading = f"**{event.name}** starts <t:{int(event.start.timestamp())}:R>\n"
+        for content in mention_messages(heading, sorted(event.attendees)):
+            await self.executor.run(message_bucket(event.channel_id),
+                                    partial(rest.create_message, event.channel_id, content, reply=event.message_id,
+                                            user_mentions=True))
+
+    async def _end(self, rest: hikari.api.RESTClient, event_uuid: int, deadline: float) -> None:
+        async with EventManager(self.guild_id) as eventmanager:
+            try:
+                event = eventmanager.get_by_uuid(event_uuid)
+            except EventNotFoundError:
+                return
+            if event.end is None or event.end.timestamp() != deadline:
+                return
+            try:
+                # a post or a delete of the event waits until it is archived, and this waits for one in progress
+                async with eventmanager.transaction(event.name) as transaction:
+                    if transaction.event is not event:
+                        # deleted and added again under the same name while waiting
+                        return
+                    await self.updater.cancel(event)
+                    if event.message_id is not None:
+                        try:
+                            await self.executor.run(message_bucket(event.channel_id),
+                                                    partial(rest.edit_message, event.channel_id, event.message_id,
+                                                            components=EventView(len(event.attendees), closed=True)))
+                        except hikari.NotFoundError:
+                            pass
+                    await asyncio.to_thread(self.archive.append, event)
+                    transaction.discard()
+            except EventNotFoundError:
+                # deleted while waiting
+                return
+        await self.workflow.discard_event(event_uuid)
+        logger.info("archived event %s", event.name)
+
+
+def mention_messages(heading: str, user_ids: list[int]) -> list[str]:
+    """ splits the mentions of `user_ids` over as few messages starting with `heading` as fit Discord's limit """
+    messages = []
+    content = heading
+    for user_id in user_ids:
+        mention = f"<@{user_id}> "
+        if len(content) + len(mention) > MAX_MESSAGE_LENGTH:
+            messages.append(content)
+            content = heading
+        content += mention
+    messages.append(content)
+    return messages
+
+
+def parse_event_time(text: str, timezone: tzinfo) -> datetime:
+    """ reads a "YYYY-MM-DD HH:MM" time in `timezone`, raising ValueError for anything else """
+    return datetime.strptime(text.strip(), "%Y-%m-%d %H:%M").replace(tzinfo=timezone)
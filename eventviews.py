@@ -1,39 +1,185 @@
+import asyncio
+from functools import partial
+import logging
+import time
+
 import hikari
 import miru
 
+from eventindex import NameKey, name_key
+from events import Event, EventManager, EventNotFoundError, EventQuery
+from metrics import timed_async
+from restqueue import RestExecutor, message_bucket
+
+JOIN_EVENT_ID = "event_view:join"
+LEAVE_EVENT_ID = "event_view:leave"
+PREVIOUS_PAGE_ID = "event_page:previous"
+NEXT_PAGE_ID = "event_page:next"
+
+logger = logging.getLogger(__name__)
+
 
 class EventView(miru.View):
-    def __init__(self, timeout):
-        super().__init__(timeout=timeout)
-        self.attendees = []
-        self.buttons = {}
+    """ RSVP buttons for a posted event.
+
+    The view is persistent: a single instance started once at startup handles the buttons on every posted event by
+    their custom ids, in every guild, and finds the event through the guild and message that was clicked. Attendees
+    are stored on the event.
+    Unstarted instances are only used to render the buttons with the current attendee count.
+
+    Clicks are acknowledged with an ephemeral reply straight away, the attendee count on the button is updated by
+    `updater` so a burst of clicks results in a single message edit. Once the event has ended it is rendered
+    `closed`, with the buttons disabled.
+    """
 
-    @miru.button(label="Join event", style=hikari.ButtonStyle.PRIMARY)
+    def __init__(self, attendee_count: int = 0, updater: 'AttendeeCountUpdater | None' = None,
+                 closed: bool = False):
+        super().__init__(timeout=None)
+        self.updater = updater
+        if attendee_count:
+            self.join_button.label = f'Join event: Attendees ({attendee_count})'
+        if closed:
+            self.join_button.label = f'Event ended: Attendees ({attendee_count})'
+            for item in self.children:
+                item.disabled = True
+
+    @property
+    def join_button(self) -> miru.Button:
+        return next(item for item in self.children if item.custom_id == JOIN_EVENT_ID)
+
+    @miru.button(label="Join event", style=hikari.ButtonStyle.PRIMARY, custom_id=JOIN_EVENT_ID)
+    @timed_async("bot_component_seconds", component="join_event")
     async def join_event(self, button: miru.Button, ctx: miru.ViewContext) -> None:
-        if self.buttons.get("join evnent") is None:
-            self.buttons["join event"] = button
-        print("join event")
-        print(button)
-        print(ctx)
-        if ctx.member.id not in self.attendees:
-            self.attendees.append(ctx.member.id)
-            button.label = f'Join event: Attendees ({len(self.attendees)})'
-            await ctx.edit_response(components=self)
+        logger.debug("%s clicked join", ctx.user.id)
+        async with EventManager(ctx.guild_id) as eventmanager:
+            try:
+                event = eventmanager.get_by_message(ctx.message.id)
+            except EventNotFoundError:
+                await ctx.respond("this event has not been posted yet", flags=hikari.MessageFlag.EPHEMERAL)
+                return
+            joined = eventmanager.join_event(event, ctx.user.id)
+        if joined:
             await ctx.respond("you joined the event", flags=hikari.MessageFlag.EPHEMERAL)
+            self.updater.schedule(ctx.bot.rest, ctx.guild_id, event)
         else:
             await ctx.respond("you already joined the event", flags=hikari.MessageFlag.EPHEMERAL)
 
-    @miru.button(label="Leave event", style=hikari.ButtonStyle.DANGER)
+    @miru.button(label="Leave event", style=hikari.ButtonStyle.DANGER, custom_id=LEAVE_EVENT_ID)
+    @timed_async("bot_component_seconds", component="leave_event")
     async def leave_event(self, button: miru.Button, ctx: miru.ViewContext) -> None:
-        if self.buttons.get("leave event") is None:
-            self.buttons["leave event"] = button
-        print("leave event")
-        print(button)
-        print(ctx)
-        if ctx.member.id in self.attendees:
-            self.attendees.remove(ctx.member.id)
-            self.buttons["join event"].label = f'Join event: Attendees ({len(self.attendees)})'
-            await ctx.edit_response(components=self)
+        logger.debug("%s clicked leave", ctx.user.id)
+        async with EventManager(ctx.guild_id) as eventmanager:
+            try:
+                event = eventmanager.get_by_message(ctx.message.id)
+            except EventNotFoundError:
+                await ctx.respond("this event has not been posted yet", flags=hikari.MessageFlag.EPHEMERAL)
+                return
+            left = eventmanager.leave_event(event, ctx.user.id)
+        if left:
             await ctx.respond("you left the event", flags=hikari.MessageFlag.EPHEMERAL)
+            self.updater.schedule(ctx.bot.rest, ctx.guild_id, event)
         else:
             await ctx.respond("you're not signed up for the event", flags=hikari.MessageFlag.EPHEMERAL)
+
+
+class AttendeeCountUpdater:
+    """ Merges the attendee count edits of an event into at most one message edit per `interval` seconds, sent
+    through the shared REST executor """
+
+    def __init__(self, executor: RestExecutor, interval: float) -> None:
+        self.executor = executor
+        self.interval = interval
+        self.scheduled: dict[int, asyncio.Task] = {}
+        # edits that have been sent and not answered yet
+        self.in_flight: dict[int, asyncio.Task] = {}
+
+    def schedule(self, rest: hikari.api.RESTClient, guild_id: int, event: Event) -> None:
+        if event.uuid not in self.scheduled:
+            self.scheduled[event.uuid] = asyncio.get_running_loop().create_task(self._update(rest, guild_id, event))
+
+    async def cancel(self, event: Event) -> None:
+        """ drops a pending edit and waits for one in flight, so neither can reopen the buttons of an event that just
+        ended """
+        update = self.scheduled.pop(event.uuid, None)
+        if update is not None:
+            update.cancel()
+        in_flight = self.in_flight.get(event.uuid)
+        if in_flight is not None:
+            await asyncio.gather(in_flight, return_exceptions=True)
+
+    async def _update(self, rest: hikari.api.RESTClient, guild_id: int, event: Event) -> None:
+        await asyncio.sleep(self.interval)
+        # clicks that arrive while the edit is in flight schedule the next one
+        del self.scheduled[event.uuid]
+        async with EventManager(guild_id) as eventmanager:
+            try:
+                current = eventmanager.get_by_uuid(event.uuid)
+            except EventNotFoundError:
+                return
+        # a deleted or ended event keeps the buttons it has
+        if current is not event or has_ended(event):
+            return
+        logger.debug("updating attendee count of %s to %s", event.name, len(event.attendees))
+        task = self.in_flight[event.uuid] = asyncio.current_task()
+        try:
+            await self.executor.run(message_bucket(event.channel_id),
+                                    partial(rest.edit_message, event.channel_id, event.message_id,
+                                            components=EventView(len(event.attendees))))
+        except Exception:
+            # e.g. the post was deleted, nobody awaits this task so the error would go unnoticed otherwise
+            logger.exception("could not update the attendee count of %s", event.name)
+        finally:
+            if self.in_flight.get(event.uuid) is task:
+                del self.in_flight[event.uuid]
+
+
+def has_ended(event: Event) -> bool:
+    return event.end is not None and event.end.timestamp() <= time.time()
+
+
+class EventPageView(miru.View):
+    """ Pages through the events matching a query.
+
+    Pages are addressed by the name of the last event on the previous page, so fetching a page only costs as much as
+    the page, however many events there are.
+    """
+
+    def __init__(self, guild_id: int, title: str, query: EventQuery, page_size: int = 10) -> None:
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.title = title
+        self.query = query
+        self.page_size = page_size
+        # the cursor each visited page starts after, the last one is the current page
+        self.cursors: list[NameKey | None] = [None]
+        self.events: list[Event] = []
+
+    async def load_page(self) -> None:
+        async with EventManager(self.guild_id) as eventmanager:
+            events = eventmanager.search(self.query, self.cursors[-1], self.page_size + 1)
+        self.events = events[:self.page_size]
+        for item in self.children:
+            if item.custom_id == PREVIOUS_PAGE_ID:
+                item.disabled = len(self.cursors) == 1
+            elif item.custom_id == NEXT_PAGE_ID:
+                item.disabled = len(events) <= self.page_size
+
+    def embed(self) -> hikari.Embed:
+        lines = [f"[{event.name}]({event.link}) · {event.state.value} · <@{event.organizer_id}>"
+                 for event in self.events]
+        return hikari.Embed(title=f"{self.title} (page {len(self.cursors)})",
+                            description="\n".join(lines) or "no events found", color=0x00ff00)
+
+    @miru.button(label="Previous", style=hikari.ButtonStyle.SECONDARY, custom_id=PREVIOUS_PAGE_ID)
+    async def previous_page(self, button: miru.Button, ctx: miru.ViewContext) -> None:
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self.load_page()
+        await ctx.edit_response(embed=self.embed(), components=self)
+
+    @miru.button(label="Next", style=hikari.ButtonStyle.SECONDARY, custom_id=NEXT_PAGE_ID)
+    async def next_page(self, button: miru.Button, ctx: miru.ViewContext) -> None:
+        if self.events:
+            self.cursors.append(name_key(self.events[-1].name))
+        await self.load_page()
+        await ctx.edit_response(embed=self.embed(), components=self)
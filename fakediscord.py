@@ -0,0 +1,233 @@
+import asyncio
+from collections import Counter, defaultdict
+import itertools
+from types import SimpleNamespace
+import typing
+
+import hikari
+from hikari.impl.entity_factory import EntityFactoryImpl
+
+from imagevalidator import ImageValidator
+
+# snowflakes handed out by the fakes, far above the small ids the benchmark uses for its own channels and users
+FIRST_SNOWFLAKE = 1 << 40
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+
+class FakeApp:
+    """ Stand-in for the bot as far as handlers and hikari entities reach for it: its REST client and entity factory """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.entity_factory = EntityFactoryImpl(self)
+        self.rest = FakeRest(self, latency)
+
+    def user(self, user_id: int, is_bot: bool = False) -> hikari.User:
+        return self.entity_factory.deserialize_user(user_payload(user_id, is_bot))
+
+    def member(self, guild_id: int, user_id: int) -> hikari.Member:
+        role_ids = self.rest.members[guild_id].get(user_id, [])
+        return self.entity_factory.deserialize_member(
+            {"user": user_payload(user_id), "roles": [str(role_id) for role_id in role_ids], "joined_at": TIMESTAMP,
+             "deaf": False, "mute": False},
+            guild_id=hikari.Snowflake(guild_id))
+
+
+class FakeRest:
+    """ In-process stand-in for hikari's REST client.
+
+    Answers the calls the bot makes after `latency` seconds with real hikari entities, built from the payloads Discord
+    would have sent, and counts the calls by method. Roles, and the roles of members, are remembered per guild so they
+    can be fetched again.
+    """
+
+    def __init__(self, app: FakeApp, latency: float = 0.0) -> None:
+        self.app = app
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.snowflakes = itertools.count(FIRST_SNOWFLAKE)
+        self.roles: defaultdict[int, dict[int, hikari.Role]] = defaultdict(dict)
+        self.members: defaultdict[int, dict[int, list[int]]] = defaultdict(dict)
+
+    async def call(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def message(self, channel: hikari.SnowflakeishOr[hikari.TextableChannel], content: typing.Any = None,
+                author_id: int = 0, message_id: int | None = None,
+                referenced_message: hikari.Message | None = None, guild_id: int = 1) -> hikari.Message:
+        payload = message_payload(next(self.snowflakes) if message_id is None else message_id, int(channel),
+                                  content, author_id, guild_id)
+        if referenced_message is not None:
+            payload["referenced_message"] = message_payload(referenced_message.id, referenced_message.channel_id,
+                                                            referenced_message.content, referenced_message.author.id,
+                                                            guild_id)
+        return self.app.entity_factory.deserialize_message(payload)
+
+    async def create_message(self, channel: hikari.SnowflakeishOr[hikari.TextableChannel],
+                             content: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> hikari.Message:
+        await self.call("create_message")
+        return self.message(channel, content)
+
+    async def edit_message(self, channel: hikari.SnowflakeishOr[hikari.TextableChannel],
+                           message: hikari.SnowflakeishOr[hikari.PartialMessage],
+                           content: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> hikari.Message:
+        await self.call("edit_message")
+        return self.message(channel, content, message_id=int(message))
+
+    async def delete_message(self, channel: hikari.SnowflakeishOr[hikari.TextableChannel],
+                             message: hikari.SnowflakeishOr[hikari.PartialMessage]) -> None:
+        await self.call("delete_message")
+
+    async def add_reaction(self, channel: hikari.SnowflakeishOr[hikari.TextableChannel],
+                           message: hikari.SnowflakeishOr[hikari.PartialMessage], emoji: typing.Any,
+                           emoji_id: typing.Any = hikari.UNDEFINED) -> None:
+        await self.call("add_reaction")
+
+    async def fetch_roles(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> list[hikari.Role]:
+        await self.call("fetch_roles")
+        return list(self.roles[int(guild)].values())
+
+    async def create_role(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild], *,
+                          name: str = "new role", color: int = 0, hoist: bool = False, mentionable: bool = False,
+                          **_: typing.Any) -> hikari.Role:
+        await self.call("create_role")
+        roles = self.roles[int(guild)]
+        role = self.app.entity_factory.deserialize_role(
+            {"id": str(next(self.snowflakes)), "name": name, "color": int(color), "hoist": hoist, "icon": None,
+             "unicode_emoji": None, "position": len(roles) + 1, "permissions": "0", "managed": False,
+             "mentionable": mentionable},
+            guild_id=hikari.Snowflake(guild))
+        roles[role.id] = role
+        return role
+
+    async def delete_role(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild],
+                          role: hikari.SnowflakeishOr[hikari.PartialRole]) -> None:
+        await self.call("delete_role")
+        self.roles[int(guild)].pop(int(role), None)
+
+    async def fetch_member(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild],
+                           user: hikari.SnowflakeishOr[hikari.User]) -> hikari.Member:
+        await self.call("fetch_member")
+        return self.app.member(int(guild), int(user))
+
+    async def edit_member(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild],
+                          user: hikari.SnowflakeishOr[hikari.User], *,
+                          roles: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> hikari.Member:
+        await self.call("edit_member")
+        if roles is not hikari.UNDEFINED:
+            self.members[int(guild)][int(user)] = [int(role) for role in roles]
+        return self.app.member(int(guild), int(user))
+
+    async def add_role_to_member(self, guild: hikari.SnowflakeishOr[hikari.PartialGuild],
+                                 user: hikari.SnowflakeishOr[hikari.User],
+                                 role: hikari.SnowflakeishOr[hikari.PartialRole], **_: typing.Any) -> None:
+        await self.call("add_role_to_member")
+        self.members[int(guild)].setdefault(int(user), []).append(int(role))
+
+
+class FakeResponse:
+    def __init__(self, message: hikari.Message) -> None:
+        self._message = message
+
+    async def message(self) -> hikari.Message:
+        return self._message
+
+
+class FakeSlashContext:
+    """ The parts of a lightbulb slash command context the commands use, responding through the fake REST client """
+
+    def __init__(self, app: FakeApp, author_id: int, guild_id: int = 0, channel_id: int = 0,
+                 **options: typing.Any) -> None:
+        self.app = self.bot = app
+        self.author = app.user(author_id)
+        self.guild_id = hikari.Snowflake(guild_id)
+        self.channel_id = hikari.Snowflake(channel_id)
+        self.options = SimpleNamespace(**options)
+
+    async def respond(self, content: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> FakeResponse:
+        await self.app.rest.call("respond")
+        return FakeResponse(self.app.rest.message(self.channel_id, content))
+
+
+class FakeViewContext:
+    """ The parts of a miru view context the views use, for a click by `user_id` on `message` """
+
+    def __init__(self, app: FakeApp, message: hikari.Message, user_id: int, guild_id: int = 0) -> None:
+        self.app = self.bot = app
+        self.message = message
+        self.user = self.author = app.user(user_id)
+        self.member = app.member(guild_id, user_id)
+        self.guild_id = hikari.Snowflake(guild_id)
+
+    async def respond(self, content: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> FakeResponse:
+        await self.app.rest.call("respond")
+        return FakeResponse(self.app.rest.message(self.message.channel_id, content))
+
+    async def edit_response(self, content: typing.Any = hikari.UNDEFINED, **_: typing.Any) -> None:
+        await self.app.rest.call("edit_response")
+
+
+class FakeGateway:
+    """ Stand-in for the gateway connection of one bot process, which runs the shards in `shard_ids`.
+
+    Discord sends the events of a guild only to the shard the guild id maps to, so `guild_available` dispatches a
+    `GuildAvailableEvent` to the subscribers for guilds on this process's shards and drops the others.
+    """
+
+    def __init__(self, app: FakeApp, shard_count: int, shard_ids: list[int]) -> None:
+        self.app = app
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.subscribers: defaultdict[type, list[typing.Callable[[typing.Any], typing.Awaitable[None]]]] = \
+            defaultdict(list)
+
+    def subscribe(self, event_type: type, callback: typing.Callable[[typing.Any], typing.Awaitable[None]]) -> None:
+        self.subscribers[event_type].append(callback)
+
+    async def guild_available(self, guild_id: int) -> None:
+        shard_id = hikari.snowflakes.calculate_shard_id(self.shard_count, guild_id)
+        if shard_id not in self.shard_ids:
+            return
+        shard = SimpleNamespace(id=shard_id, shard_count=self.shard_count, app=self.app)
+        guild = SimpleNamespace(id=hikari.Snowflake(guild_id), app=self.app)
+        event = hikari.GuildAvailableEvent(shard=typing.cast(hikari.api.GatewayShard, shard),
+                                           guild=typing.cast(hikari.GatewayGuild, guild), emojis={}, stickers={},
+                                           roles={}, channels={}, threads={}, members={}, presences={},
+                                           voice_states={})
+        await asyncio.gather(*(callback(event) for callback in self.subscribers[hikari.GuildAvailableEvent]))
+
+
+class FakeImageValidator(ImageValidator):
+    """ Treats every http(s) link as an image after `latency` seconds, keeping the real cache in front of it """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+
+    async def _probe(self, url: str) -> bool | None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return url.startswith(("http://", "https://"))
+
+
+def guild_message(app: FakeApp, channel_id: int, content: str, author_id: int,
+                  referenced_message: hikari.Message | None = None,
+                  guild_id: int = 1) -> hikari.GuildMessageCreateEvent:
+    """ the gateway event for a member posting `content` in a guild channel, optionally as a reply """
+    message = app.rest.message(channel_id, content, author_id, referenced_message=referenced_message,
+                               guild_id=guild_id)
+    return hikari.GuildMessageCreateEvent(message=message, shard=typing.cast(hikari.api.GatewayShard, None))
+
+
+def user_payload(user_id: int, is_bot: bool = False) -> dict[str, typing.Any]:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "bot": is_bot}
+
+
+def message_payload(message_id: int, channel_id: int, content: typing.Any, author_id: int,
+                    guild_id: int = 1) -> dict[str, typing.Any]:
+    return {"id": str(message_id), "channel_id": str(channel_id), "guild_id": str(guild_id),
+            "author": user_payload(author_id, is_bot=author_id == 0),
+            "content": content if isinstance(content, str) else "", "timestamp": TIMESTAMP,
+            "edited_timestamp": None, "tts": False, "mentions": [], "mention_roles": [], "mention_everyone": False,
+            "attachments": [], "embeds": [], "pinned": False, "type": 0, "flags": 0}
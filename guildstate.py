@@ -0,0 +1,107 @@
+import asyncio
+from datetime import timedelta
+import logging
+import os
+from zoneinfo import ZoneInfo
+
+import hikari
+
+from configmanager import ConfigManager, GuildConfig
+from eventarchive import ARCHIVE_FILE_NAME, EventArchive
+from eventscheduler import EventScheduler
+from eventviews import AttendeeCountUpdater
+from restqueue import RestExecutor
+from roleregistry import YEAR_ROLES_FILE_NAME, YearRoleRegistry
+from workflow import WORKFLOW_FILE_NAME, WorkflowTable
+
+logger = logging.getLogger(__name__)
+
+
+class GuildState:
+    """ Everything the bot keeps for one guild, stored in the guild's own state folder.
+
+    Nothing in here is shared with other guilds, so a busy guild never holds a lock or a file another guild waits for.
+    """
+
+    def __init__(self, config: GuildConfig, executor: RestExecutor, updater: AttendeeCountUpdater) -> None:
+        self.config = config
+        self.workflow = WorkflowTable(in_state_path(config, WORKFLOW_FILE_NAME))
+        self.year_roles = YearRoleRegistry(in_state_path(config, YEAR_ROLES_FILE_NAME))
+        self.archive = EventArchive(in_state_path(config, ARCHIVE_FILE_NAME))
+        self.timezone = ZoneInfo(config.timezone)
+        self.scheduler = EventScheduler(config.guild_id, executor, self.archive, self.workflow, updater,
+                                        timedelta(minutes=config.reminder_minutes))
+        # held while the role menu is edited or posted, so concurrent updates don't post it twice
+        self.role_menu_lock = asyncio.Lock()
+        self.start_lock = asyncio.Lock()
+        self.started = False
+
+    async def start(self, rest: hikari.api.RESTClient) -> None:
+        """ reconciles the year roles and starts the scheduler, the first time the guild becomes available only """
+        async with self.start_lock:
+            if self.started:
+                return
+            await self.year_roles.reconcile(rest, self.config.guild_id)
+            await self.scheduler.start(rest)
+            self.started = True
+            logger.info("guild %s started", self.config.guild_id)
+
+    async def stop(self) -> None:
+        await self.scheduler.stop()
+
+
+class GuildStates:
+    """ The state of every guild the bot serves, loaded the first time each guild is used """
+
+    def __init__(self, config: ConfigManager, executor: RestExecutor, updater: AttendeeCountUpdater) -> None:
+        self.config = config
+        self.executor = executor
+        self.updater = updater
+        self.states: dict[int, GuildState] = {}
+        self.unconfigured: set[int] = set()
+        # guilds being loaded, so concurrent first uses share a single load
+        self.loading: dict[int, asyncio.Future[GuildState | None]] = {}
+
+    async def get(self, guild_id: int) -> GuildState | None:
+        """ None for guilds the bot has no configuration for.
+
+        The first use reads the guild's config and state files on a worker thread, so it doesn't hold up the event loop.
+        """
+        state = self.states.get(guild_id)
+        if state is not None or guild_id in self.unconfigured:
+            return state
+        loading = self.loading.get(guild_id)
+        if loading is None:
+            loading = self.loading[guild_id] = asyncio.ensure_future(asyncio.to_thread(self._load, guild_id))
+            loading.add_done_callback(lambda _: self.loading.pop(guild_id, None))
+        return await asyncio.shield(loading)
+
+    def loaded(self, guild_id: int) -> GuildState | None:
+        """ the state of a guild `get` has loaded, for callers that can't wait for a load """
+        return self.states.get(guild_id)
+
+    def _load(self, guild_id: int) -> GuildState | None:
+        guild_config = self.config.guild(guild_id)
+        if guild_config is None:
+            self.unconfigured.add(guild_id)
+            return None
+        state = self.states[guild_id] = GuildState(guild_config, self.executor, self.updater)
+        return state
+
+    async def on_guild_available(self, event: hikari.GuildAvailableEvent | hikari.GuildJoinEvent) -> None:
+        """ guilds are started as their shard sees them, so each process only does the work of the guilds it serves """
+        guild = await self.get(event.guild_id)
+        if guild is not None:
+            await guild.start(event.app.rest)
+
+    def year_roles(self, guild_id: int) -> YearRoleRegistry | None:
+        """ for the role menu, which is only posted in guilds that are loaded """
+        state = self.loaded(guild_id)
+        return None if state is None else state.year_roles
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(state.stop() for state in self.states.values()))
+
+
+def in_state_path(config: GuildConfig, file_name: str) -> str:
+    return os.path.join(config.state_path, os.path.basename(file_name))
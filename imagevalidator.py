@@ -0,0 +1,74 @@
+import asyncio
+from collections import OrderedDict
+import time
+
+import aiohttp
+
+# servers that refuse HEAD requests answer with one of these, those are probed with a ranged GET instead
+HEAD_NOT_SUPPORTED = {403, 405, 501}
+
+
+class ImageValidator:
+    """ Checks that a URL points at an image, without blocking the event loop.
+
+    Probes share one pooled aiohttp session and start with a HEAD request, falling back to a GET for the first byte
+    when the server does not answer HEAD. Results are kept in a cache that expires entries after `ttl` seconds and
+    evicts the least recently used entry beyond `max_entries`, and concurrent checks of the same URL share a probe.
+    Unreachable URLs count as invalid but are not cached.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 1024, timeout: float = 5,
+                 max_connections: int = 10) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.session: aiohttp.ClientSession | None = None
+        self.cache: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+        self.probes: dict[str, asyncio.Task[bool | None]] = {}
+
+    async def is_image(self, url: str) -> bool:
+        cached = self.cache.get(url)
+        if cached is not None:
+            expires, is_image = cached
+            if expires > time.monotonic():
+                self.cache.move_to_end(url)
+                return is_image
+            del self.cache[url]
+        probe = self.probes.get(url)
+        if probe is None:
+            probe = self.probes[url] = asyncio.get_running_loop().create_task(self._probe(url))
+            probe.add_done_callback(lambda _: self.probes.pop(url, None))
+        is_image = await asyncio.shield(probe)
+        if is_image is None:
+            # the server could not be reached, so there is nothing worth remembering
+            return False
+        self.cache[url] = (time.monotonic() + self.ttl, is_image)
+        self.cache.move_to_end(url)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return is_image
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _probe(self, url: str) -> bool | None:
+        if not url.startswith(("http://", "https://")):
+            return False
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout,
+                                                 connector=aiohttp.TCPConnector(limit=self.max_connections))
+        try:
+            async with self.session.head(url, allow_redirects=True) as response:
+                if response.status not in HEAD_NOT_SUPPORTED:
+                    return response.ok and is_image_type(response.content_type)
+            async with self.session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True) as response:
+                return response.ok and is_image_type(response.content_type)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+
+def is_image_type(content_type: str | None) -> bool:
+    return content_type is not None and content_type.startswith("image/")
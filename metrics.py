@@ -0,0 +1,144 @@
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+import functools
+import time
+from typing import ParamSpec, TypeVar
+
+from aiohttp import web
+
+P = ParamSpec('P')
+T = TypeVar('T')
+
+# upper bounds in seconds, from cache hits up to slow REST calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # the last count is for observations above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """ upper bound of the bucket the q-quantile falls into """
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Registry:
+    """ Histograms and counters by metric name and labels, rendered in the Prometheus text format """
+
+    def __init__(self) -> None:
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.counters: dict[str, dict[Labels, Counter]] = {}
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        return histogram
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        counter = series.get(key)
+        if counter is None:
+            counter = series[key] = Counter()
+        return counter
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        for name, series in sorted(self.counters.items()):
+            lines.append(f'# TYPE {name} counter')
+            for labels, counter in sorted(series.items()):
+                lines.append(f'{name}{format_labels(labels)} {counter.value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """ one line per timed series with its count and approximate p50 and p99, for humans """
+        lines = []
+        for name, series in sorted(self.histograms.items()):
+            for labels, histogram in sorted(series.items()):
+                lines.append(f'{name}{format_labels(labels)} n={histogram.count} '
+                             f'p50<={histogram.quantile(0.5)}s p99<={histogram.quantile(0.99)}s')
+        for name, series in sorted(self.counters.items()):
+            for labels, counter in sorted(series.items()):
+                lines.append(f'{name}{format_labels(labels)} {counter.value}')
+        return '\n'.join(lines)
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+registry = Registry()
+
+
+@contextmanager
+def timed(name: str, **labels: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.histogram(name, **labels).observe(time.perf_counter() - start)
+
+
+def timed_async(name: str, **labels: str) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+    """ decorator that records how long each call of an async function takes """
+    def decorator(function: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            with timed(name, **labels):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def start_metrics_server(port: int, host: str = '127.0.0.1') -> web.AppRunner:
+    """ serves the registry on http://host:port/metrics, returns the runner to clean up on shutdown """
+    async def metrics(_: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
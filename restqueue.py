@@ -0,0 +1,101 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+import logging
+from typing import TypeVar
+
+import hikari
+
+from metrics import registry, timed
+
+T = TypeVar('T')
+
+# Discord's limits for a single message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS_PER_MESSAGE = 4000
+
+
+class RestExecutor:
+    """ Shared queue for outbound REST calls.
+
+    Calls on different route buckets (e.g. different channels, or roles versus messages) run concurrently, calls on
+    the same bucket are limited to `per_bucket` at a time so a burst queues up here instead of running into 429s.
+    hikari already waits out short rate limits, calls it gives up on are retried after the delay Discord asked for.
+    """
+
+    def __init__(self, per_bucket: int = 5, retries: int = 3) -> None:
+        self.per_bucket = per_bucket
+        self.retries = retries
+        self.buckets: dict[str, asyncio.Semaphore] = {}
+
+    async def run(self, bucket: str, call: Callable[[], Awaitable[T]]) -> T:
+        semaphore = self.buckets.get(bucket)
+        if semaphore is None:
+            semaphore = self.buckets[bucket] = asyncio.Semaphore(self.per_bucket)
+        # the bucket kind without the channel or guild id, to keep the number of series small
+        route = bucket.split(':')[0]
+        async with semaphore:
+            with timed('rest_call_seconds', route=route):
+                for _ in range(self.retries):
+                    try:
+                        return await call()
+                    except hikari.RateLimitTooLongError as error:
+                        registry.counter('rest_rate_limit_gave_up_total', route=route).inc()
+                        await asyncio.sleep(error.retry_after)
+                return await call()
+
+    async def gather(self, calls: Iterable[tuple[str, Callable[[], Awaitable[T]]]],
+                     return_exceptions: bool = False) -> list[T | BaseException]:
+        """ runs independent (bucket, call) pairs concurrently and returns their results in order, with the errors of
+        failed calls in their place if `return_exceptions` is set """
+        return await asyncio.gather(*(self.run(bucket, call) for bucket, call in calls),
+                                    return_exceptions=return_exceptions)
+
+
+class RateLimitCounter(logging.Filter):
+    """ Counts the 429s hikari retries by itself, which it only reports by logging them.
+
+    Added to the `hikari.rest` logger, records pass through unchanged. hikari logs these as warnings and errors, so
+    they are only counted while the log level lets warnings through.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str) and record.msg.startswith('rate limited'):
+            registry.counter('rest_rate_limited_total', scope=rate_limit_scope(record.msg)).inc()
+        return True
+
+
+def rate_limit_scope(message: str) -> str:
+    if 'global bucket' in message:
+        return 'global'
+    if 'sub bucket' in message:
+        return 'sub_bucket'
+    return 'bucket'
+
+
+def message_bucket(channel: hikari.SnowflakeishOr[hikari.TextableChannel]) -> str:
+    return f'messages:{int(channel)}'
+
+
+def role_bucket(guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> str:
+    return f'roles:{int(guild)}'
+
+
+def member_bucket(guild: hikari.SnowflakeishOr[hikari.PartialGuild]) -> str:
+    return f'members:{int(guild)}'
+
+
+def paginate_embeds(embeds: Iterable[hikari.Embed]) -> list[list[hikari.Embed]]:
+    """ packs embeds into as few messages as Discord's per message embed count and size limits allow """
+    pages: list[list[hikari.Embed]] = []
+    page: list[hikari.Embed] = []
+    page_length = 0
+    for embed in embeds:
+        length = embed.total_length()
+        if page and (len(page) == MAX_EMBEDS_PER_MESSAGE or page_length + length > MAX_EMBED_CHARACTERS_PER_MESSAGE):
+            pages.append(page)
+            page, page_length = [], 0
+        page.append(embed)
+        page_length += length
+    if page:
+        pages.append(page)
+    return pages
@@ -0,0 +1,91 @@
+import asyncio
+from functools import partial
+import logging
+
+import hikari
+
+from restqueue import RestExecutor, member_bucket
+
+logger = logging.getLogger(__name__)
+
+MemberKey = tuple[int, int]
+
+
+class MemberRoleCache:
+    """ Role ids of guild members, kept current by gateway member events and the member sent along with every
+    interaction, so swapping a role never has to fetch the member first """
+
+    def __init__(self) -> None:
+        self.roles: dict[MemberKey, frozenset[int]] = {}
+
+    def get(self, guild_id: int, user_id: int) -> frozenset[int] | None:
+        return self.roles.get((guild_id, user_id))
+
+    def remember(self, member: hikari.Member) -> None:
+        # hikari lists the guild's @everyone role among the member's roles, Discord doesn't accept it back
+        self.roles[member.guild_id, member.id] = frozenset(member.role_ids) - {member.guild_id}
+
+    def set(self, guild_id: int, user_id: int, role_ids: frozenset[int]) -> None:
+        self.roles[guild_id, user_id] = role_ids
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        self.roles.pop((guild_id, user_id), None)
+
+
+class RoleAssigner:
+    """ Queue of role swaps, applied by a few background workers through the REST executor.
+
+    A swap replaces a set of roles on a member with one role in a single `edit_member` call. Swaps for the same member
+    that are still waiting are merged, so a member changing their mind quickly costs one call, and a burst of members
+    queues up here instead of running into rate limits.
+    """
+
+    def __init__(self, executor: RestExecutor, cache: MemberRoleCache, workers: int = 2) -> None:
+        self.executor = executor
+        self.cache = cache
+        self.workers = workers
+        # the role to give and the roles it replaces, by member
+        self.pending: dict[MemberKey, tuple[int, frozenset[int]]] = {}
+        self.queue: asyncio.Queue[MemberKey] = asyncio.Queue()
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self, rest: hikari.api.RESTClient) -> None:
+        self.tasks = [asyncio.get_running_loop().create_task(self._work(rest)) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def swap(self, guild_id: int, user_id: int, role_id: int, replaces: frozenset[int]) -> None:
+        key = guild_id, user_id
+        if key not in self.pending:
+            self.queue.put_nowait(key)
+        self.pending[key] = role_id, replaces
+
+    async def _work(self, rest: hikari.api.RESTClient) -> None:
+        while True:
+            guild_id, user_id = key = await self.queue.get()
+            try:
+                role_id, replaces = self.pending.pop(key)
+                await self._apply(rest, guild_id, user_id, role_id, replaces)
+            except Exception:
+                logger.exception("could not swap the roles of %s", user_id)
+            finally:
+                self.queue.task_done()
+
+    async def _apply(self, rest: hikari.api.RESTClient, guild_id: int, user_id: int, role_id: int,
+                     replaces: frozenset[int]) -> None:
+        current = self.cache.get(guild_id, user_id)
+        if current is None:
+            # only members who never interacted or showed up in a member event since startup end up here
+            self.cache.remember(await self.executor.run(member_bucket(guild_id),
+                                                        partial(rest.fetch_member, guild_id, user_id)))
+            current = self.cache.get(guild_id, user_id)
+        roles = (current - replaces) | {role_id}
+        if roles == current:
+            return
+        await self.executor.run(member_bucket(guild_id),
+                                partial(rest.edit_member, guild_id, user_id, roles=sorted(roles)))
+        self.cache.set(guild_id, user_id, roles)
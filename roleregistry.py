@@ -0,0 +1,130 @@
+import asyncio
+from functools import partial
+import json
+import logging
+import os
+
+import hikari
+
+from events import EVENTS_FILE_PATH, write_snapshot
+from restqueue import RestExecutor, role_bucket
+
+YEAR_ROLES_FILE_NAME = f'{EVENTS_FILE_PATH}/year_roles.json'
+YEAR_ROLE_COLOR = 0x00ff00
+
+logger = logging.getLogger(__name__)
+
+
+class YearRoleUpdateError(Exception):
+    """ Some of the role creates or deletes of an update failed. The ones that went through are recorded and saved. """
+
+    def __init__(self, deleted: list[int], created: list[int], failed: dict[int, BaseException]) -> None:
+        super().__init__(f'could not update the roles of {sorted(failed)}')
+        self.deleted = deleted
+        self.created = created
+        self.failed = failed
+
+
+class YearRoleRegistry:
+    """ The year roles the bot manages, by year, and the message holding the role menu, persisted across restarts.
+
+    The registry is reconciled against the guild once at startup with a single `fetch_roles` call, from then on it is
+    the source of truth, so changing the years only costs the role creates and deletes that actually differ.
+    """
+
+    def __init__(self, path: str = YEAR_ROLES_FILE_NAME) -> None:
+        self.path = path
+        self.roles: dict[int, int] = {}
+        # channel and message id of the posted role menu
+        self.menu: tuple[int, int] | None = None
+        self.save_lock = asyncio.Lock()
+        # updates run one at a time, so concurrent /update_years calls don't both create the missing roles
+        self.update_lock = asyncio.Lock()
+        if os.path.exists(path):
+            with open(path) as roles_file:
+                state = json.load(roles_file)
+            self.roles = {int(year): role_id for year, role_id in state['roles'].items()}
+            if state['menu'] is not None:
+                self.menu = state['menu']['channel_id'], state['menu']['message_id']
+
+    def year_of(self, role_id: int) -> int | None:
+        return next((year for year, year_role_id in self.roles.items() if year_role_id == role_id), None)
+
+    async def reconcile(self, rest: hikari.api.RESTClient, guild: hikari.Snowflakeish) -> None:
+        """ forgets roles deleted from the guild and adopts untracked roles named after a year, like those created
+        before the registry existed """
+        guild_roles = await rest.fetch_roles(guild)
+        role_ids = {role.id for role in guild_roles}
+        forgotten = [year for year, role_id in self.roles.items() if role_id not in role_ids]
+        for year in forgotten:
+            del self.roles[year]
+        adopted = []
+        tracked = set(self.roles.values())
+        for role in sorted(guild_roles, key=lambda role: role.position):
+            if len(role.name) != 4 or not role.name.isdigit() or role.id in tracked:
+                continue
+            year = int(role.name)
+            # duplicates left behind by older versions stay in the guild untouched, only the first one is tracked
+            if year not in self.roles:
+                self.roles[year] = role.id
+                adopted.append(year)
+        if forgotten or adopted:
+            logger.info("year roles reconciled, forgot %s, adopted %s", forgotten, adopted)
+            await self.save()
+
+    async def update(self, executor: RestExecutor, rest: hikari.api.RESTClient, guild: hikari.Snowflakeish,
+                     years: list[int]) -> tuple[list[int], list[int]]:
+        """ creates and deletes roles concurrently until there is exactly one per year, returns the deleted and
+        created years.
+
+        Raises YearRoleUpdateError if any call failed, after recording the calls that went through, so running the
+        update again only retries the failed years.
+        """
+        async with self.update_lock:
+            stale_years = [year for year in self.roles if year not in years]
+            missing_years = [year for year in years if year not in self.roles]
+            bucket = role_bucket(guild)
+            deletes = executor.gather(((bucket, partial(delete_role, rest, guild, self.roles[year]))
+                                       for year in stale_years), return_exceptions=True)
+            creates = executor.gather(((bucket, partial(rest.create_role, guild, name=str(year),
+                                                        color=YEAR_ROLE_COLOR, hoist=True, mentionable=True))
+                                       for year in missing_years), return_exceptions=True)
+            delete_results, create_results = await asyncio.gather(deletes, creates)
+            failed: dict[int, BaseException] = {}
+            deleted = []
+            for year, result in zip(stale_years, delete_results):
+                if isinstance(result, BaseException):
+                    failed[year] = result
+                else:
+                    del self.roles[year]
+                    deleted.append(year)
+            created = []
+            for year, result in zip(missing_years, create_results):
+                if isinstance(result, BaseException):
+                    failed[year] = result
+                else:
+                    self.roles[year] = result.id
+                    created.append(year)
+            if deleted or created:
+                await self.save()
+        if failed:
+            raise YearRoleUpdateError(deleted, created, failed)
+        return deleted, created
+
+    async def set_menu(self, channel_id: int, message_id: int) -> None:
+        self.menu = channel_id, message_id
+        await self.save()
+
+    async def save(self) -> None:
+        async with self.save_lock:
+            state = {'roles': {str(year): role_id for year, role_id in sorted(self.roles.items())},
+                     'menu': None if self.menu is None else {'channel_id': self.menu[0], 'message_id': self.menu[1]}}
+            await asyncio.to_thread(write_snapshot, state, self.path)
+
+
+async def delete_role(rest: hikari.api.RESTClient, guild: hikari.Snowflakeish, role_id: int) -> None:
+    try:
+        await rest.delete_role(guild, role_id)
+    except hikari.NotFoundError:
+        # already deleted by hand, which is what we wanted anyway
+        pass
@@ -1,36 +1,59 @@
+from collections.abc import Callable
+import logging
+
 import hikari
 import miru
-import discord
+
+from roleassigner import RoleAssigner
+from roleregistry import YearRoleRegistry
+
+YEAR_SELECT_ID = "role_view:year"
+
+logger = logging.getLogger(__name__)
 
 
 class RoleView(miru.View):
-    def __init__(self, years: dict[int, hikari.Role.id]) -> None:
-        super().__init__(timeout=600)
-        self.years = years
-        self.select: miru.TextSelect = None
+    """ Year role menu.
+
+    Persistent like the RSVP buttons: a single instance started at startup handles selections on the posted menus of
+    every guild by their custom id, looking up the guild's registry through `registries`, so the menus keep working
+    across restarts. Unstarted instances render the menu with the years currently registered for `guild_id`.
+
+    Picking a year replaces any other year role the member has. The swap is queued on `assigner`, which makes one
+    `edit_member` call per member from the roles it already knows.
+    """
+
+    def __init__(self, registries: Callable[[int], YearRoleRegistry | None], assigner: RoleAssigner | None = None,
+                 guild_id: int | None = None) -> None:
+        super().__init__(timeout=None)
+        self.registries = registries
+        self.assigner = assigner
+        registry = None if guild_id is None else registries(guild_id)
+        roles = {} if registry is None else registry.roles
+        options = [miru.SelectOption(label=str(year), value=str(role_id), description="the year you enrolled at SDU",
+                                     emoji="📅")
+                   for year, role_id in sorted(roles.items(), reverse=True)]
+        if options:
+            self.year_select.options = options
+
+    @property
+    def year_select(self) -> miru.TextSelect:
+        return next(item for item in self.children if item.custom_id == YEAR_SELECT_ID)
 
-    @miru.text_select(placeholder="select the year", min_values=1, max_values=1,
-                      options=[miru.SelectOption(label="placeholder")])
+    @miru.text_select(placeholder="select the year", min_values=1, max_values=1, custom_id=YEAR_SELECT_ID,
+                      options=[miru.SelectOption(label="no years yet")])
     async def role_select(self, select: miru.TextSelect, ctx: miru.ViewContext) -> None:
-        print("role select")
-        # Discord does not allow you to instantiate options in run-time, so we have to do this manually by creating
-        # it at compile time, and then modifying it at run-time.
-        if select.values[0] == "placeholder":
-            self.select = select
-            options: list[hikari.SelectMenuOption] = [hikari.SelectMenuOption(
-                label=str(year), description="the year you enrolled at SDU",
-                value=str(self.years[year].id),
-                is_default=False,
-                emoji=hikari.emojis.UnicodeEmoji("📅"))
-                for year in self.years.keys()]
-            select.options = options
-            new_select = await ctx.respond(components=self)
-            await self.start(new_select)
-            await ctx.respond("you activated the year role menu")
+        logger.debug("%s selected %s", ctx.author.id, select.values)
+        role_id = int(select.values[0]) if select.values[0].isdigit() else 0
+        registry = self.registries(ctx.guild_id) if ctx.guild_id is not None else None
+        year = None if registry is None else registry.year_of(role_id)
+        if year is None:
+            await ctx.respond("this year is no longer available", flags=hikari.MessageFlag.EPHEMERAL)
             return
-        await ctx.respond(f"you selected {select.values[0]}", flags=hikari.MessageFlag.EPHEMERAL)
-        print(self.years)
-        await ctx.bot.rest.add_role_to_member(ctx.guild_id, ctx.author.id, int(select.values[0]))
+        if ctx.member is not None:
+            self.assigner.cache.remember(ctx.member)
+        self.assigner.swap(ctx.guild_id, ctx.author.id, role_id, frozenset(registry.roles.values()))
+        await ctx.respond(f"you selected {year}", flags=hikari.MessageFlag.EPHEMERAL)
 
 # class TestSelect(miru.View):
 #
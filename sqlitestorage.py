@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import sys
+
+from eventjournal import JOURNAL_FILE_BASE_NAME, EventJournal
+from events import EVENTS_FILE_BASE_NAME, EVENTS_FILE_NAME, EVENTS_FILE_PATH, Event, EventState, EventStorage, \
+    EventStore, format_datetime, parse_datetime
+
+DATABASE_FILE_BASE_NAME = 'events.sqlite3'
+DATABASE_FILE_NAME = f'{EVENTS_FILE_PATH}/{DATABASE_FILE_BASE_NAME}'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    uuid TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    link TEXT NOT NULL,
+    organizer_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    description TEXT,
+    image_link TEXT,
+    channel_id INTEGER,
+    message_id INTEGER,
+    starts_at TEXT,
+    ends_at TEXT,
+    reminded INTEGER NOT NULL DEFAULT 0
+);
+-- the bot itself answers state and organizer lookups from memory, these keep queries run on the database cheap
+CREATE INDEX IF NOT EXISTS events_by_state ON events (state, name);
+CREATE INDEX IF NOT EXISTS events_by_organizer ON events (organizer_id, name);
+CREATE TABLE IF NOT EXISTS attendees (
+    event_uuid TEXT NOT NULL REFERENCES events (uuid) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    joined_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_uuid, user_id)
+);
+CREATE INDEX IF NOT EXISTS attendees_by_user ON attendees (user_id);
+'''
+
+EVENT_COLUMNS = ('uuid, name, link, organizer_id, state, description, image_link, channel_id, message_id, starts_at, '
+                 'ends_at, reminded')
+INSERT_EVENT = f'INSERT INTO events ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+DELETE_EVENT = 'DELETE FROM events WHERE name = ?'
+SET_DESCRIPTION = 'UPDATE events SET description = ? WHERE name = ?'
+SET_IMAGE_LINK = 'UPDATE events SET image_link = ? WHERE name = ?'
+SET_STATE = 'UPDATE events SET state = ? WHERE name = ?'
+SET_POST = 'UPDATE events SET channel_id = ?, message_id = ? WHERE name = ?'
+MARK_REMINDED = 'UPDATE events SET reminded = 1 WHERE name = ?'
+INSERT_ATTENDEE = 'INSERT OR IGNORE INTO attendees (event_uuid, user_id) VALUES (?, ?)'
+JOIN_EVENT = 'INSERT OR IGNORE INTO attendees (event_uuid, user_id) SELECT uuid, ? FROM events WHERE name = ?'
+LEAVE_EVENT = 'DELETE FROM attendees WHERE user_id = ? AND event_uuid = (SELECT uuid FROM events WHERE name = ?)'
+SELECT_ATTENDEES = 'SELECT event_uuid, user_id FROM attendees ORDER BY rowid'
+SELECT_EVENTS = f'SELECT {EVENT_COLUMNS} FROM events'
+
+
+class SqliteStorage(EventStorage):
+    """ Keeps events and their attendees in a SQLite database in WAL mode.
+
+    Journal records are turned into one parameterized statement each, so sqlite3 reuses its prepared statements,
+    and every commit is a single transaction. The connection is only used from the event writer thread once the
+    events are loaded; lookups and the list commands are served from the in-memory `EventStore`.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE_NAME, import_from: str | None = EVENTS_FILE_NAME) -> None:
+        self.path = path
+        # the events file of the JSON and journal backends, imported along with the journal next to it
+        self.import_from = import_from
+        self.connection: sqlite3.Connection | None = None
+
+    @classmethod
+    def in_directory(cls, directory: str) -> 'SqliteStorage':
+        return cls(f'{directory}/{DATABASE_FILE_BASE_NAME}', f'{directory}/{EVENTS_FILE_BASE_NAME}')
+
+    def load(self) -> EventStore:
+        is_new = not os.path.exists(self.path)
+        self.connection = connect(self.path)
+        if is_new and self.import_from is not None:
+            import_events(self.connection, self.import_from)
+        events = {row[0]: row_to_event(row) for row in self.connection.execute(SELECT_EVENTS)}
+        for event_uuid, user_id in self.connection.execute(SELECT_ATTENDEES):
+            events[event_uuid].attendees.add(user_id)
+        return EventStore(events.values())
+
+    def prepare(self, store: EventStore, records: list[dict]) -> list[dict]:
+        return records
+
+    def write(self, prepared: list[dict]) -> None:
+        with self.connection:
+            for record in prepared:
+                for statement, parameters in record_to_statements(record):
+                    self.connection.execute(statement, parameters)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def record_to_statements(record: dict) -> list[tuple[str, tuple]]:
+    op = record['op']
+    if op == 'add':
+        event = Event.from_dict(record['event'])
+        # deleting first also drops the attendees of an event with the same name
+        return [(DELETE_EVENT, (event.name,)), (INSERT_EVENT, event_to_row(event))] + attendee_statements(event)
+    if op == 'discard':
+        return [(DELETE_EVENT, (record['name'],))]
+    if op == 'set_event_description':
+        return [(SET_DESCRIPTION, (record['description'], record['name']))]
+    if op == 'set_image_link':
+        return [(SET_IMAGE_LINK, (record['image_link'], record['name']))]
+    if op == 'submit_event':
+        return [(SET_STATE, (EventState.submitted.value, record['name']))]
+    if op == 'set_post':
+        return [(SET_POST, (record['channel_id'], record['message_id'], record['name']))]
+    if op == 'join_event':
+        return [(JOIN_EVENT, (record['user_id'], record['name']))]
+    if op == 'leave_event':
+        return [(LEAVE_EVENT, (record['user_id'], record['name']))]
+    if op == 'mark_reminded':
+        return [(MARK_REMINDED, (record['name'],))]
+    raise ValueError(f'unknown journal operation {op!r}')
+
+
+def attendee_statements(event: Event) -> list[tuple[str, tuple]]:
+    return [(INSERT_ATTENDEE, (str(event.uuid), user_id)) for user_id in event.attendees]
+
+
+def event_to_row(event: Event) -> tuple:
+    return (str(event.uuid), event.name, event.link, event.organizer_id, event.state.value, event.description,
+            event.image_link, event.channel_id, event.message_id, format_datetime(event.start),
+            format_datetime(event.end), int(event.reminded))
+
+
+def row_to_event(row: tuple) -> Event:
+    (event_uuid, name, link, organizer_id, state, description, image_link, channel_id, message_id, starts_at, ends_at,
+     reminded) = row
+    return Event(name, link, organizer_id, EventState(state), description, int(event_uuid), image_link,
+                 channel_id=channel_id, message_id=message_id, start=parse_datetime(starts_at),
+                 end=parse_datetime(ends_at), reminded=bool(reminded))
+
+
+def import_events(connection: sqlite3.Connection, path: str = EVENTS_FILE_NAME) -> int:
+    """ copies every event kept by the JSON or journal backend into the database, returns how many were read.
+
+    The events file alone misses whatever is still in the journal next to it, so the import loads both the way the
+    journal backend does, which also folds the journal into the events file. Older files share a single uuid between
+    all events, the store hands out new ones.
+    """
+    path = os.path.abspath(path)
+    store = EventJournal(path, os.path.join(os.path.dirname(path), JOURNAL_FILE_BASE_NAME)).load()
+    with connection:
+        for event in store:
+            connection.execute(INSERT_EVENT, event_to_row(event))
+            for statement, parameters in attendee_statements(event):
+                connection.execute(statement, parameters)
+    return len(store)
+
+
+if __name__ == '__main__':
+    # one-shot migration: python sqlitestorage.py [events.json] [events.sqlite3], the journal next to events.json is
+    # imported as well
+    source = sys.argv[1] if len(sys.argv) > 1 else EVENTS_FILE_NAME
+    target = sys.argv[2] if len(sys.argv) > 2 else DATABASE_FILE_NAME
+    print(f'imported {import_events(connect(target), source)} events into {target}')
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import hikari
+import miru
+import pytest
+
+# the bot's modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def miru_installed():
+    """ views can only be built once miru knows the bot, and it can only be told once per process """
+    miru.install(hikari.GatewayBot('token', banner=None))
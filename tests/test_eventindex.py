@@ -0,0 +1,44 @@
+from eventindex import PrefixTrie
+
+
+def trie(*names):
+    prefixes = PrefixTrie()
+    for name in names:
+        prefixes.add(name)
+    return prefixes
+
+
+def test_complete_returns_names_in_case_insensitive_order():
+    prefixes = trie('Quiz night', 'lan party', 'LAN', 'lan', 'Lamp workshop', 'quiz')
+    assert prefixes.complete('la') == ['Lamp workshop', 'LAN', 'lan', 'lan party']
+    assert prefixes.complete('QUIZ') == ['quiz', 'Quiz night']
+    assert prefixes.complete('') == ['Lamp workshop', 'LAN', 'lan', 'lan party', 'quiz', 'Quiz night']
+    assert prefixes.complete('x') == []
+
+
+def test_complete_stops_at_the_limit():
+    prefixes = trie(*(f'event {i:03d}' for i in range(200)))
+    assert prefixes.complete('event 1', limit=3) == ['event 100', 'event 101', 'event 102']
+
+
+def test_remove_prunes_branches_that_lead_to_no_name():
+    prefixes = trie('lan', 'lan party')
+    prefixes.remove('lan party')
+    assert prefixes.complete('lan') == ['lan']
+    # nothing is left below the node of 'lan'
+    node = prefixes.root
+    for character in 'lan':
+        node = node.children[character]
+    assert node.children == {}
+    prefixes.remove('lan')
+    assert prefixes.root.children == {}
+
+
+def test_remove_keeps_names_that_fold_to_the_same_key():
+    prefixes = trie('LAN', 'lan')
+    prefixes.remove('LAN')
+    assert prefixes.complete('l') == ['lan']
+    # removing a name that was never added changes nothing
+    prefixes.remove('lanyard')
+    prefixes.remove('quiz')
+    assert prefixes.complete('l') == ['lan']
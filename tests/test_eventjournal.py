@@ -0,0 +1,118 @@
+import json
+import threading
+
+from eventjournal import EventJournal, read_journal
+from events import Event, JsonFileStorage
+
+
+def commit(storage, store):
+    storage.write(storage.prepare(store, store.take_pending()))
+
+
+def journal_with_events(tmp_path, *names, compact_after=500):
+    storage = EventJournal.in_directory(str(tmp_path))
+    storage.compact_after = compact_after
+    store = storage.load()
+    for name in names:
+        store.add(Event(name, f'https://example.com/{name}', 1))
+        commit(storage, store)
+    return storage, store
+
+
+def test_records_are_replayed_on_load(tmp_path):
+    storage, store = journal_with_events(tmp_path, 'party', 'lan')
+    store.join_event(store.by_name['lan'], 42)
+    store.discard(store.by_name['party'])
+    commit(storage, store)
+    reloaded = EventJournal.in_directory(str(tmp_path)).load()
+    assert [event.name for event in reloaded] == ['lan']
+    assert reloaded.by_name['lan'].attendees == {42}
+
+
+def test_load_folds_the_journal_into_the_snapshot(tmp_path):
+    journal_with_events(tmp_path, 'party')
+    EventJournal.in_directory(str(tmp_path)).load()
+    assert not (tmp_path / 'events.journal').exists()
+    with open(tmp_path / 'events.json') as events_file:
+        assert [event['name'] for event in json.load(events_file)] == ['party']
+
+
+def test_torn_record_is_dropped_and_later_records_kept(tmp_path):
+    journal_with_events(tmp_path, 'party')
+    with open(tmp_path / 'events.journal', 'a') as journal_file:
+        journal_file.write('{"op": "add", "event": {"na')
+    storage = EventJournal.in_directory(str(tmp_path))
+    store = storage.load()
+    assert [event.name for event in store] == ['party']
+    store.add(Event('lan', 'https://example.com/lan', 1))
+    commit(storage, store)
+    assert {event.name for event in EventJournal.in_directory(str(tmp_path)).load()} == {'party', 'lan'}
+
+
+def test_read_journal_stops_at_a_torn_record(tmp_path):
+    path = tmp_path / 'events.journal'
+    path.write_text('{"op": "discard", "name": "a"}\n{"op": "disc')
+    assert read_journal(str(path)) == [{'op': 'discard', 'name': 'a'}]
+
+
+def test_compaction_writes_a_snapshot_and_starts_a_new_journal(tmp_path):
+    storage, store = journal_with_events(tmp_path, 'a', 'b', 'c', compact_after=2)
+    storage.compaction.join()
+    with open(tmp_path / 'events.json') as events_file:
+        assert {event['name'] for event in json.load(events_file)} == {'a', 'b'}
+    assert not (tmp_path / 'events.journal.compacting').exists()
+    assert [record['event']['name'] for record in read_journal(str(tmp_path / 'events.journal'))] == ['c']
+    assert {event.name for event in EventJournal.in_directory(str(tmp_path)).load()} == {'a', 'b', 'c'}
+
+
+def test_compaction_serializes_the_events_on_its_own_thread(tmp_path, monkeypatch):
+    storage, store = journal_with_events(tmp_path, 'a', compact_after=3)
+    for name in ('b', 'c'):
+        store.add(Event(name, f'https://example.com/{name}', 1))
+    threads = []
+    to_dict = Event.to_dict
+    monkeypatch.setattr(Event, 'to_dict', lambda event: threads.append(threading.current_thread()) or to_dict(event))
+    commit(storage, store)
+    storage.compaction.join()
+    assert threads and threading.current_thread() not in threads
+    with open(tmp_path / 'events.json') as events_file:
+        assert {event['name'] for event in json.load(events_file)} == {'a', 'b', 'c'}
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    journal_with_events(tmp_path, 'party', 'lan')
+    # as if the bot stopped after rotating the journal but before the snapshot was written
+    (tmp_path / 'events.journal').rename(tmp_path / 'events.journal.compacting')
+    store = EventJournal.in_directory(str(tmp_path)).load()
+    assert {event.name for event in store} == {'party', 'lan'}
+    assert not (tmp_path / 'events.journal.compacting').exists()
+
+
+def test_torn_record_next_to_an_interrupted_compaction_is_dropped(tmp_path):
+    journal_with_events(tmp_path, 'a', 'b')
+    (tmp_path / 'events.journal').rename(tmp_path / 'events.journal.compacting')
+    # and the crash also tore the first record of the live journal
+    (tmp_path / 'events.journal').write_text('{"op": "add", "event": {"na')
+    storage = EventJournal.in_directory(str(tmp_path))
+    store = storage.load()
+    store.add(Event('c', 'https://example.com/c', 1))
+    commit(storage, store)
+    assert {event.name for event in EventJournal.in_directory(str(tmp_path)).load()} == {'a', 'b', 'c'}
+
+def test_json_backend_replays_a_journal_left_behind(tmp_path):
+    journal_with_events(tmp_path, 'party', 'lan')
+    store = JsonFileStorage.in_directory(str(tmp_path)).load()
+    assert {event.name for event in store} == {'party', 'lan'}
+    # and the journal backend still sees the same events after the JSON backend rewrote the file
+    store.add(Event('quiz', 'https://example.com/quiz', 1))
+    json_storage = JsonFileStorage.in_directory(str(tmp_path))
+    commit(json_storage, store)
+    assert {event.name for event in EventJournal.in_directory(str(tmp_path)).load()} == {'party', 'lan', 'quiz'}
+
+
+def test_shared_uuids_are_reassigned_once(tmp_path):
+    events = [Event(name, 'https://example.com', 1, uuid=7) for name in ('a', 'b')]
+    (tmp_path / 'events.json').write_text(json.dumps([event.to_dict() for event in events]))
+    store = EventJournal.in_directory(str(tmp_path)).load()
+    assert len({event.uuid for event in store}) == 2
+    assert {event.uuid for event in EventJournal.in_directory(str(tmp_path)).load()} == \
+        {event.uuid for event in store}
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from eventarchive import EventArchive
+from events import Event, EventManager, JsonFileStorage, configure_storage
+from eventscheduler import EventScheduler, mention_messages
+from eventviews import AttendeeCountUpdater
+from fakediscord import FakeApp
+from restqueue import RestExecutor
+from workflow import WorkflowTable
+
+GUILD_ID = 1
+
+
+@pytest.fixture
+def state_directory(tmp_path):
+    configure_storage(lambda guild_id: JsonFileStorage.in_directory(str(tmp_path)))
+    yield tmp_path
+    configure_storage(lambda guild_id: JsonFileStorage())
+
+
+def test_event_is_archived_after_a_timed_wait(state_directory):
+    archive = EventArchive(str(state_directory / 'archive.jsonl'))
+    workflow = WorkflowTable(str(state_directory / 'workflow.jsonl'))
+
+    async def main():
+        now = datetime.now(timezone.utc)
+        event = Event('party', 'https://example.com', 1, start=now, end=now + timedelta(seconds=0.2))
+        async with EventManager(GUILD_ID) as eventmanager:
+            eventmanager.add(event)
+        executor = RestExecutor()
+        scheduler = EventScheduler(GUILD_ID, executor, archive, workflow, AttendeeCountUpdater(executor, 0.01),
+                                   timedelta(minutes=60))
+        # the scheduler sleeps through a timed wait before the end comes due
+        await scheduler.start(FakeApp().rest)
+        await asyncio.sleep(0.5)
+        assert not scheduler.task.done()
+        await scheduler.stop()
+        async with EventManager(GUILD_ID) as eventmanager:
+            assert len(eventmanager.store) == 0
+
+    asyncio.run(main())
+    assert [event.name for event in archive.read()] == ['party']
+
+
+def test_mentions_are_split_over_messages():
+    messages = mention_messages('heading\n', list(range(10**17, 10**17 + 200)))
+    assert len(messages) > 1
+    assert all(len(message) <= 2000 and message.startswith('heading\n') for message in messages)
+    assert sum(message.count('<@') for message in messages) == 200
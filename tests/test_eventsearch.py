@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+import random
+
+from eventindex import SortedNameIndex, name_key
+from events import Event, EventQuery, EventState, EventStore
+
+
+@dataclass
+class CountingQuery(EventQuery):
+    """ counts the events the search had to look at """
+    checked: int = 0
+
+    def matches(self, event: Event) -> bool:
+        self.checked += 1
+        return super().matches(event)
+
+
+def store_with_events(count: int, submitted_every: int = 100) -> EventStore:
+    return EventStore(Event(f'Event {i:05d}', 'https://example.com', i % 7,
+                            EventState.submitted if i % submitted_every == 0 else EventState.in_progress)
+                      for i in range(count))
+
+
+def all_pages(store: EventStore, query: EventQuery, page_size: int = 10) -> list[str]:
+    names, after = [], None
+    while True:
+        page = store.search(query, after, page_size)
+        names += [event.name for event in page]
+        if len(page) < page_size:
+            return names
+        after = name_key(page[-1].name)
+
+
+def test_pages_match_a_full_scan():
+    store = store_with_events(2000, submitted_every=13)
+    rng = random.Random(1)
+    queries = [EventQuery(),
+               EventQuery(EventState.submitted),
+               EventQuery(EventState.in_progress, prefix='event 01'),
+               EventQuery(organizer_id=3, prefix='EVENT 0'),
+               EventQuery(EventState.submitted, organizer_id=2),
+               EventQuery(substring='12'),
+               EventQuery(EventState.submitted, substring='123'),
+               EventQuery(organizer_id=99)]
+    queries += [EventQuery(rng.choice([None, *EventState]), rng.choice([None, 1, 4]), f'event {rng.randrange(3)}',
+                           str(rng.randrange(100))) for _ in range(20)]
+    for query in queries:
+        expected = sorted((event.name for event in store if query.matches(event)), key=name_key)
+        assert all_pages(store, query, page_size=7) == expected, query
+
+
+def test_page_of_a_rare_state_only_looks_at_that_state():
+    store = store_with_events(10_000)
+    query = CountingQuery(EventState.submitted)
+    assert len(store.search(query, limit=10)) == 10
+    assert query.checked == 10
+
+
+def test_state_index_follows_state_changes_and_removals():
+    store = store_with_events(100)
+    event = store.by_name['Event 00001']
+    store.submit_event(event)
+    assert event.name in [event.name for event in store.search(EventQuery(EventState.submitted), limit=100)]
+    store.discard(event)
+    assert event.name not in [event.name for event in store.search(EventQuery(EventState.submitted), limit=100)]
+    assert store.search(EventQuery(EventState.submitted), limit=100)[0].name == 'Event 00000'
+
+
+def test_substring_page_is_picked_in_order():
+    store = store_with_events(1000)
+    names = [event.name for event in store.search(EventQuery(substring='999'), limit=3)]
+    assert names == ['Event 00999']
+    names = [event.name for event in store.search(EventQuery(substring='vent 00'), name_key('Event 00050'), 3)]
+    assert names == ['Event 00051', 'Event 00052', 'Event 00053']
+
+
+def test_count_by_prefix():
+    index = SortedNameIndex(['apple', 'Apricot', 'banana', 'ap'])
+    assert index.count() == 4
+    assert index.count('AP') == 3
+    assert index.count('apr') == 1
+    assert index.count('c') == 0
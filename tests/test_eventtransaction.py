@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from eventarchive import EventArchive
+from events import Event, EventConflictError, EventManager, EventState, JsonFileStorage, configure_storage
+from eventscheduler import EventScheduler
+from eventviews import AttendeeCountUpdater
+from fakediscord import FakeApp
+from restqueue import RestExecutor
+from workflow import WorkflowTable
+
+GUILD_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def state_directory(tmp_path):
+    configure_storage(lambda guild_id: JsonFileStorage.in_directory(str(tmp_path)))
+    yield tmp_path
+    configure_storage(lambda guild_id: JsonFileStorage())
+
+
+async def add_party(**fields) -> Event:
+    event = Event('party', 'https://example.com', 1, **fields)
+    async with EventManager(GUILD_ID) as eventmanager:
+        eventmanager.add(event)
+    return event
+
+
+async def post(event_name: str, message_id: int) -> None:
+    """ like the bot posting an event: the transaction is held while the post is sent """
+    async with EventManager(GUILD_ID) as eventmanager, eventmanager.transaction(event_name) as transaction:
+        await asyncio.sleep(0.05)
+        transaction.set_post(100, message_id)
+        transaction.submit_event()
+
+
+def test_changes_are_only_applied_when_the_block_completes():
+    async def main():
+        await add_party()
+        async with EventManager(GUILD_ID) as eventmanager:
+            with pytest.raises(RuntimeError):
+                async with eventmanager.transaction('party') as transaction:
+                    transaction.set_event_description('lost')
+                    raise RuntimeError()
+            assert eventmanager['party'].description is None
+            async with eventmanager.transaction('party') as transaction:
+                transaction.set_event_description('kept')
+            assert eventmanager['party'].description == 'kept'
+
+    asyncio.run(main())
+
+
+def test_delete_waits_for_a_post_in_progress():
+    async def delete():
+        async with EventManager(GUILD_ID) as eventmanager, eventmanager.transaction('party') as transaction:
+            transaction.discard()
+
+    async def main():
+        await add_party()
+        posting = asyncio.create_task(post('party', 1000))
+        await asyncio.sleep(0.01)
+        await delete()
+        # the post committed first, so nothing conflicted
+        await posting
+        async with EventManager(GUILD_ID) as eventmanager:
+            assert 'party' not in eventmanager.store.by_name
+            assert 1000 not in eventmanager.store.by_message
+
+    asyncio.run(main())
+
+
+def test_writer_bypassing_the_lock_is_a_conflict():
+    async def main():
+        await add_party()
+        async with EventManager(GUILD_ID) as eventmanager:
+            with pytest.raises(EventConflictError):
+                async with eventmanager.transaction('party') as transaction:
+                    transaction.submit_event()
+                    # replaced by something that doesn't take the lock
+                    eventmanager.discard('party')
+                    eventmanager.add(Event('party', 'https://example.com', 2))
+            assert eventmanager['party'].state is EventState.in_progress
+
+    asyncio.run(main())
+
+
+def test_archiving_waits_for_a_post_in_progress(state_directory, miru_installed):
+    archive = EventArchive(str(state_directory / 'archive.jsonl'))
+    workflow = WorkflowTable(str(state_directory / 'workflow.jsonl'))
+
+    async def main():
+        end = datetime.now(timezone.utc) - timedelta(minutes=1)
+        event = await add_party(start=end - timedelta(hours=1), end=end)
+        executor = RestExecutor()
+        scheduler = EventScheduler(GUILD_ID, executor, archive, workflow, AttendeeCountUpdater(executor, 0.01),
+                                   timedelta(minutes=60))
+        posting = asyncio.create_task(post('party', 1000))
+        await asyncio.sleep(0.01)
+        await scheduler._end(FakeApp().rest, event.uuid, end.timestamp())
+        await posting
+        async with EventManager(GUILD_ID) as eventmanager:
+            assert 'party' not in eventmanager.store.by_name
+
+    asyncio.run(main())
+    # archived with the post it got while the archive waited
+    assert [event.message_id for event in archive.read()] == [1000]
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import logging
+
+import hikari
+import pytest
+
+from events import Event, EventManager, JsonFileStorage, configure_storage
+from eventviews import AttendeeCountUpdater
+from fakediscord import FakeApp
+from restqueue import RestExecutor
+
+GUILD_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def state_directory(tmp_path, miru_installed):
+    configure_storage(lambda guild_id: JsonFileStorage.in_directory(str(tmp_path)))
+    yield tmp_path
+    configure_storage(lambda guild_id: JsonFileStorage())
+
+
+async def posted_event(**fields) -> Event:
+    event = Event('party', 'https://example.com', 1, channel_id=100, message_id=1000, **fields)
+    event.attendees.add(42)
+    async with EventManager(GUILD_ID) as eventmanager:
+        eventmanager.add(event)
+    return event
+
+
+def test_burst_of_changes_is_one_edit():
+    async def main():
+        app = FakeApp()
+        updater = AttendeeCountUpdater(RestExecutor(), 0.05)
+        event = await posted_event()
+        for _ in range(5):
+            updater.schedule(app.rest, GUILD_ID, event)
+        await asyncio.sleep(0.1)
+        return app.rest.calls['edit_message']
+
+    assert asyncio.run(main()) == 1
+
+
+def test_failed_edit_is_logged(caplog):
+    async def main():
+        app = FakeApp()
+
+        async def deleted_post(*_, **__):
+            raise hikari.NotFoundError('https://discord.com', {}, b'')
+
+        app.rest.edit_message = deleted_post
+        updater = AttendeeCountUpdater(RestExecutor(), 0.01)
+        event = await posted_event()
+        updater.schedule(app.rest, GUILD_ID, event)
+        task = updater.scheduled[event.uuid]
+        await asyncio.sleep(0.05)
+        assert task.done() and task.exception() is None
+
+    with caplog.at_level(logging.ERROR, logger='eventviews'):
+        asyncio.run(main())
+    assert 'could not update the attendee count of party' in caplog.text
+
+
+def test_deleted_or_ended_events_are_not_edited():
+    async def main():
+        app = FakeApp()
+        updater = AttendeeCountUpdater(RestExecutor(), 0.01)
+        deleted = await posted_event()
+        async with EventManager(GUILD_ID) as eventmanager:
+            eventmanager.discard('party')
+        updater.schedule(app.rest, GUILD_ID, deleted)
+        await asyncio.sleep(0.05)
+        now = datetime.now(timezone.utc)
+        ended = await posted_event(start=now - timedelta(hours=2), end=now)
+        updater.schedule(app.rest, GUILD_ID, ended)
+        await asyncio.sleep(0.05)
+        return app.rest.calls['edit_message']
+
+    assert asyncio.run(main()) == 0
+
+
+def test_cancel_waits_for_the_edit_in_flight():
+    async def main():
+        app = FakeApp(latency=0.1)
+        updater = AttendeeCountUpdater(RestExecutor(), 0.01)
+        event = await posted_event()
+        updater.schedule(app.rest, GUILD_ID, event)
+        # past the debounce, the edit is waiting on the slow REST call
+        await asyncio.sleep(0.03)
+        assert updater.in_flight
+        await updater.cancel(event)
+        # once cancel returns the edit has been answered, so a closing edit sent now lands after it
+        assert not updater.in_flight
+        assert app.rest.calls['edit_message'] == 1
+
+    asyncio.run(main())
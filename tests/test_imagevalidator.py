@@ -0,0 +1,136 @@
+import asyncio
+from collections import Counter
+import socket
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from imagevalidator import ImageValidator
+
+
+def stub_app(requests: Counter) -> web.Application:
+    """ answers like an image host: /image.png is an image, /page is HTML, /no-head refuses HEAD, /slow hangs """
+
+    async def handle(request: web.Request) -> web.Response:
+        requests[request.method, request.path] += 1
+        if request.path == '/slow':
+            await asyncio.sleep(1)
+        if request.path == '/no-head' and request.method == 'HEAD':
+            return web.Response(status=405)
+        if request.path == '/page':
+            return web.Response(text='<html></html>', content_type='text/html')
+        if request.path == '/delayed.png':
+            await asyncio.sleep(0.1)
+        return web.Response(body=b'\x89PNG', content_type='image/png')
+
+    app = web.Application()
+    app.router.add_route('*', '/{path:.*}', handle)
+    return app
+
+
+def run_against_stub(check, **validator_options) -> Counter:
+    """ runs `check(validator, base_url)` against a fresh stub server, returns the requests it received """
+    requests = Counter()
+
+    async def main():
+        server = TestServer(stub_app(requests), host='127.0.0.1')
+        await server.start_server()
+        validator = ImageValidator(**validator_options)
+        try:
+            await check(validator, str(server.make_url('')))
+        finally:
+            await validator.close()
+            await server.close()
+
+    asyncio.run(main())
+    return requests
+
+
+def test_head_with_image_content_type():
+    async def check(validator, base):
+        assert await validator.is_image(f'{base}/image.png')
+
+    assert run_against_stub(check) == {('HEAD', '/image.png'): 1}
+
+
+def test_ranged_get_when_head_is_refused():
+    async def check(validator, base):
+        assert await validator.is_image(f'{base}/no-head')
+
+    assert run_against_stub(check) == {('HEAD', '/no-head'): 1, ('GET', '/no-head'): 1}
+
+
+def test_other_content_type_is_no_image():
+    async def check(validator, base):
+        assert not await validator.is_image(f'{base}/page')
+        # the answer is cached
+        assert not await validator.is_image(f'{base}/page')
+
+    assert run_against_stub(check) == {('HEAD', '/page'): 1}
+
+
+def test_timeout_is_no_image_and_not_cached():
+    async def check(validator, base):
+        assert not await validator.is_image(f'{base}/slow')
+        assert f'{base}/slow' not in validator.cache
+
+    run_against_stub(check, timeout=0.2)
+
+
+def test_connection_refused_is_no_image_and_not_cached():
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+    url = f'http://127.0.0.1:{port}/image.png'
+
+    async def main():
+        validator = ImageValidator(timeout=2)
+        try:
+            assert not await validator.is_image(url)
+            assert url not in validator.cache
+        finally:
+            await validator.close()
+
+    asyncio.run(main())
+
+
+def test_non_http_links_are_no_image():
+    async def main():
+        assert not await ImageValidator().is_image('ftp://example.com/image.png')
+
+    asyncio.run(main())
+
+
+def test_cache_hit():
+    async def check(validator, base):
+        for _ in range(3):
+            assert await validator.is_image(f'{base}/image.png')
+
+    assert run_against_stub(check) == {('HEAD', '/image.png'): 1}
+
+
+def test_cache_entries_expire():
+    async def check(validator, base):
+        assert await validator.is_image(f'{base}/image.png')
+        await asyncio.sleep(0.1)
+        assert await validator.is_image(f'{base}/image.png')
+
+    assert run_against_stub(check, ttl=0.05) == {('HEAD', '/image.png'): 2}
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def check(validator, base):
+        for path in ('a.png', 'b.png', 'a.png', 'c.png', 'a.png', 'b.png'):
+            assert await validator.is_image(f'{base}/{path}')
+
+    requests = run_against_stub(check, max_entries=2)
+    # b was the least recently used when c came in, a stayed cached throughout
+    assert requests == {('HEAD', '/a.png'): 1, ('HEAD', '/b.png'): 2, ('HEAD', '/c.png'): 1}
+
+
+def test_concurrent_checks_share_one_probe():
+    async def check(validator, base):
+        results = await asyncio.gather(*(validator.is_image(f'{base}/delayed.png') for _ in range(5)))
+        assert results == [True] * 5
+
+    assert run_against_stub(check) == {('HEAD', '/delayed.png'): 1}
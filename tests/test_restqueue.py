@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+import hikari
+import pytest
+
+from metrics import registry
+from restqueue import RateLimitCounter, RestExecutor
+
+
+@pytest.fixture
+def hikari_rest_logger():
+    logger = logging.getLogger('hikari.rest')
+    counter = RateLimitCounter()
+    logger.addFilter(counter)
+    yield logger
+    logger.removeFilter(counter)
+
+
+def counted(name: str, **labels: str) -> int:
+    return registry.counter(name, **labels).value
+
+
+def test_rate_limits_hikari_retries_are_counted(hikari_rest_logger):
+    before = {scope: counted('rest_rate_limited_total', scope=scope) for scope in ('bucket', 'global', 'sub_bucket')}
+    # the messages hikari logs when it receives a 429 and retries
+    hikari_rest_logger.warning("rate limited on bucket %s, maybe you are running more than one bot on this token? "
+                               "Retrying request...", 'abc')
+    hikari_rest_logger.error("rate limited on the global bucket. You should consider lowering the number of requests "
+                             "you make or contacting Discord to raise this limit. Backing off and retrying request...")
+    hikari_rest_logger.error("rate limited on a %s sub bucket on bucket %s. You should consider lowering the number "
+                             "of requests you make to '%s'. Backing off and retrying request...", 'user', 'abc', 'r')
+    hikari_rest_logger.error("something else went wrong")
+    assert {scope: counted('rest_rate_limited_total', scope=scope) - before[scope] for scope in before} == \
+        {'bucket': 1, 'global': 1, 'sub_bucket': 1}
+
+
+def test_calls_hikari_gave_up_on_are_retried_and_counted():
+    attempts = []
+
+    async def call():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise hikari.RateLimitTooLongError(route=None, is_global=False, retry_after=0.01, max_retry_after=0,
+                                               reset_at=0, limit=None, period=None)
+        return 'done'
+
+    before = counted('rest_rate_limit_gave_up_total', route='messages')
+    assert asyncio.run(RestExecutor().run('messages:1', call)) == 'done'
+    assert len(attempts) == 2
+    assert counted('rest_rate_limit_gave_up_total', route='messages') == before + 1
+
+
+def test_other_errors_are_raised():
+    async def call():
+        raise ValueError('not a rate limit')
+
+    with pytest.raises(ValueError):
+        asyncio.run(RestExecutor().run('messages:1', call))
@@ -0,0 +1,61 @@
+import asyncio
+
+from fakediscord import FakeApp
+from restqueue import RestExecutor
+from roleassigner import MemberRoleCache, RoleAssigner
+
+GUILD_ID = 1
+YEAR_ROLES = frozenset({2022, 2023, 2024})
+# a role that isn't a year, which swaps leave alone
+MODERATOR = 7
+
+
+def test_remember_drops_the_everyone_role():
+    app = FakeApp()
+    # hikari reports @everyone, whose id is the guild's, as one of the member's roles
+    app.rest.members[GUILD_ID][5] = [GUILD_ID, MODERATOR, 2022]
+    cache = MemberRoleCache()
+    cache.remember(app.member(GUILD_ID, 5))
+    assert cache.get(GUILD_ID, 5) == {MODERATOR, 2022}
+
+
+def run_swaps(app, cache, swaps):
+    async def main():
+        assigner = RoleAssigner(RestExecutor(), cache)
+        # queued before the workers start, like a burst arriving faster than they keep up
+        for user_id, role_id in swaps:
+            assigner.swap(GUILD_ID, user_id, role_id, YEAR_ROLES)
+        assigner.start(app.rest)
+        await assigner.queue.join()
+        await assigner.stop()
+
+    asyncio.run(main())
+
+
+def test_pending_swaps_of_a_member_are_merged_into_one_edit():
+    app = FakeApp()
+    cache = MemberRoleCache()
+    cache.set(GUILD_ID, 5, frozenset({MODERATOR, 2022}))
+    cache.set(GUILD_ID, 6, frozenset())
+    run_swaps(app, cache, [(5, 2023), (6, 2022), (5, 2024), (5, 2023)])
+    assert app.rest.calls['edit_member'] == 2
+    assert sorted(app.rest.members[GUILD_ID][5]) == [MODERATOR, 2023]
+    assert cache.get(GUILD_ID, 5) == {MODERATOR, 2023}
+
+
+def test_uncached_member_is_fetched_once():
+    app = FakeApp()
+    app.rest.members[GUILD_ID][5] = [GUILD_ID, 2022]
+    cache = MemberRoleCache()
+    run_swaps(app, cache, [(5, 2023)])
+    run_swaps(app, cache, [(5, 2024)])
+    assert app.rest.calls['fetch_member'] == 1
+    assert app.rest.members[GUILD_ID][5] == [2024]
+
+
+def test_swap_to_the_role_the_member_has_makes_no_call():
+    app = FakeApp()
+    cache = MemberRoleCache()
+    cache.set(GUILD_ID, 5, frozenset({2023}))
+    run_swaps(app, cache, [(5, 2023)])
+    assert app.rest.calls['edit_member'] == 0
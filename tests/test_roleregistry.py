@@ -0,0 +1,73 @@
+import asyncio
+from collections import Counter
+
+import hikari
+import pytest
+
+from fakediscord import FakeApp
+from restqueue import RestExecutor
+from roleregistry import YearRoleRegistry, YearRoleUpdateError
+
+GUILD_ID = 1
+YEARS = [2023, 2022, 2021, 2020]
+
+
+def role_names(app):
+    return Counter(role.name for role in app.rest.roles[GUILD_ID].values())
+
+
+def test_update_creates_and_deletes_only_the_difference(tmp_path):
+    app = FakeApp()
+    registry = YearRoleRegistry(str(tmp_path / 'year_roles.json'))
+
+    async def update():
+        await registry.update(RestExecutor(), app.rest, GUILD_ID, YEARS)
+        return await registry.update(RestExecutor(), app.rest, GUILD_ID, [2024, 2023, 2022, 2021])
+
+    assert asyncio.run(update()) == ([2020], [2024])
+    assert role_names(app) == Counter({'2024': 1, '2023': 1, '2022': 1, '2021': 1})
+    assert sorted(YearRoleRegistry(registry.path).roles) == [2021, 2022, 2023, 2024]
+
+
+def test_failed_create_keeps_the_roles_that_were_created(tmp_path):
+    app = FakeApp()
+    registry = YearRoleRegistry(str(tmp_path / 'year_roles.json'))
+    create_role = app.rest.create_role
+
+    async def third_create_fails(guild, **options):
+        if app.rest.calls['create_role'] == 2:
+            app.rest.calls['create_role'] += 1
+            raise hikari.InternalServerError('https://discord.com', {}, b'', 500)
+        return await create_role(guild, **options)
+
+    async def update_and_retry():
+        app.rest.create_role = third_create_fails
+        with pytest.raises(YearRoleUpdateError) as error:
+            await registry.update(RestExecutor(), app.rest, GUILD_ID, YEARS)
+        assert sorted(error.value.failed) == [2021]
+        assert sorted(YearRoleRegistry(registry.path).roles) == [2020, 2022, 2023]
+        return await registry.update(RestExecutor(), app.rest, GUILD_ID, YEARS)
+
+    assert asyncio.run(update_and_retry()) == ([], [2021])
+    assert role_names(app) == Counter({'2023': 1, '2022': 1, '2021': 1, '2020': 1})
+
+
+def test_reconcile_forgets_deleted_roles_and_adopts_year_roles(tmp_path):
+    app = FakeApp()
+    registry = YearRoleRegistry(str(tmp_path / 'year_roles.json'))
+
+    async def reconcile():
+        await registry.update(RestExecutor(), app.rest, GUILD_ID, [2023, 2022])
+        await app.rest.delete_role(GUILD_ID, registry.roles[2022])
+        # created by hand, or by a version of the bot without the registry
+        for name in ('2021', '2021', 'moderators'):
+            await app.rest.create_role(GUILD_ID, name=name)
+        await registry.reconcile(app.rest, GUILD_ID)
+
+    asyncio.run(reconcile())
+    assert sorted(registry.roles) == [2021, 2023]
+    # only the first of the duplicates is tracked
+    first_2021 = min((role for role in app.rest.roles[GUILD_ID].values() if role.name == '2021'),
+                     key=lambda role: role.position)
+    assert registry.roles[2021] == first_2021.id
+    assert YearRoleRegistry(registry.path).roles == registry.roles
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+
+import hikari
+import pytest
+
+from configmanager import ConfigManager
+from eventjournal import EventJournal
+from events import JsonFileStorage, configure_storage
+from eventviews import AttendeeCountUpdater
+from fakediscord import FakeApp, FakeGateway
+from guildstate import GuildStates
+from restqueue import RestExecutor
+from workflow import WorkflowStage
+
+SHARD_COUNT = 2
+# the shard of a guild is taken from the timestamp bits of its id, so these alternate between the two shards
+GUILD_IDS = [(i + 1) << 22 for i in range(6)]
+GUILD_CONFIG = {'event_channel_id': 1, 'enigma_role_id': 2, 'role_channel_id': 3, 'event_prototype_channel_id': 4}
+
+
+@pytest.fixture(autouse=True)
+def deployment(tmp_path, monkeypatch):
+    """ one config file per process, sharing the guild files like processes started from the same folder would """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('config/guilds')
+    for shard_id in range(SHARD_COUNT):
+        with open(f'config/shard{shard_id}.json', 'w') as config_file:
+            json.dump({'token': 'token', 'enigma_discord_id': GUILD_IDS[0], 'shard_count': SHARD_COUNT,
+                       'shard_ids': [shard_id], **GUILD_CONFIG}, config_file)
+    for guild_id in GUILD_IDS[1:]:
+        with open(f'config/guilds/{guild_id}.json', 'w') as guild_file:
+            json.dump(GUILD_CONFIG, guild_file)
+    state_path = ConfigManager('config/shard0.json').state_path
+    configure_storage(lambda guild_id: EventJournal.in_directory(state_path(guild_id)))
+    yield
+    configure_storage(lambda guild_id: JsonFileStorage())
+
+
+def test_each_process_starts_only_the_guilds_on_its_shards():
+    async def run_processes():
+        processes = []
+        for shard_id in range(SHARD_COUNT):
+            config = ConfigManager(f'config/shard{shard_id}.json')
+            executor = RestExecutor()
+            guilds = GuildStates(config, executor, AttendeeCountUpdater(executor, 0.01))
+            gateway = FakeGateway(FakeApp(), config.shard_count, config.shard_ids)
+            gateway.subscribe(hikari.GuildAvailableEvent, guilds.on_guild_available)
+            processes.append((guilds, gateway))
+        # every guild becomes available on the gateway of each process, as far as Discord is concerned
+        for guild_id in GUILD_IDS:
+            await asyncio.gather(*(gateway.guild_available(guild_id) for _, gateway in processes))
+        for guilds, _ in processes:
+            for guild_id, guild in guilds.states.items():
+                await guild.workflow.register(guild_id, guild_id, WorkflowStage.describe)
+            await guilds.stop()
+        return [guilds for guilds, _ in processes]
+
+    processes = asyncio.run(run_processes())
+    for shard_id, guilds in enumerate(processes):
+        assert sorted(guilds.states) == [guild_id for guild_id in GUILD_IDS
+                                         if (guild_id >> 22) % SHARD_COUNT == shard_id]
+        assert all(guild.started for guild in guilds.states.values())
+    assert sorted(guild_id for guilds in processes for guild_id in guilds.states) == GUILD_IDS
+    # the main guild keeps its state in the folder the other guilds' folders are in, so files are compared, not trees
+    written = [{os.path.dirname(guild.workflow.path) for guild in guilds.states.values()
+                if os.path.exists(guild.workflow.path)} for guilds in processes]
+    assert [len(directories) for directories in written] == [len(guilds.states) for guilds in processes]
+    assert not written[0] & written[1]
+
+
+def test_shard_ids_without_shard_count_are_rejected():
+    with open('config/shard_ids_only.json', 'w') as config_file:
+        json.dump({'token': 'token', 'enigma_discord_id': GUILD_IDS[0], 'shard_ids': [0], **GUILD_CONFIG},
+                  config_file)
+    with pytest.raises(ValueError, match='shard_count'):
+        ConfigManager('config/shard_ids_only.json')
+
+
+def test_concurrent_first_uses_share_one_load():
+    async def first_uses():
+        executor = RestExecutor()
+        guilds = GuildStates(ConfigManager('config/shard0.json'), executor, AttendeeCountUpdater(executor, 0.01))
+        states = await asyncio.gather(*(guilds.get(GUILD_IDS[1]) for _ in range(5)))
+        return guilds, states, await guilds.get(12345)
+
+    guilds, states, unconfigured = asyncio.run(first_uses())
+    assert len({id(state) for state in states}) == 1
+    assert guilds.loaded(GUILD_IDS[1]) is states[0]
+    assert unconfigured is None and list(guilds.states) == [GUILD_IDS[1]]
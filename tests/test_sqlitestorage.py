@@ -0,0 +1,44 @@
+import pytest
+
+from eventjournal import EventJournal
+from events import Event, EventManager, EventState, JsonFileStorage, configure_storage
+from sqlitestorage import SqliteStorage
+
+
+@pytest.fixture
+def journal_directory(tmp_path):
+    """ a state folder with events that so far only reached the journal """
+    configure_storage(lambda guild_id: EventJournal.in_directory(str(tmp_path)))
+    with EventManager() as eventmanager:
+        for name in ('party', 'lan', 'talk'):
+            eventmanager.add(Event(name, f'https://example.com/{name}', 1))
+    with EventManager() as eventmanager:
+        eventmanager.join_event(eventmanager['lan'], 42)
+        eventmanager.discard('talk')
+    yield tmp_path
+    configure_storage(lambda guild_id: JsonFileStorage())
+
+
+def test_first_start_imports_the_journal(journal_directory):
+    assert not (journal_directory / 'events.json').exists()
+    store = SqliteStorage.in_directory(str(journal_directory)).load()
+    assert {event.name for event in store} == {'party', 'lan'}
+    assert store.by_name['lan'].attendees == {42}
+
+
+def test_import_keeps_snapshot_and_journal_tail(journal_directory):
+    # fold what is there into the events file, then add to the journal only
+    EventJournal.in_directory(str(journal_directory)).load()
+    configure_storage(lambda guild_id: EventJournal.in_directory(str(journal_directory)))
+    with EventManager() as eventmanager:
+        eventmanager.add(Event('quiz', 'https://example.com/quiz', 2, EventState.submitted))
+    store = SqliteStorage.in_directory(str(journal_directory)).load()
+    assert {event.name for event in store} == {'party', 'lan', 'quiz'}
+    assert store.by_name['quiz'].state is EventState.submitted
+
+
+def test_existing_database_is_not_imported_again(journal_directory):
+    storage = SqliteStorage.in_directory(str(journal_directory))
+    storage.load()
+    storage.write([{'op': 'discard', 'name': 'party'}])
+    assert {event.name for event in SqliteStorage.in_directory(str(journal_directory)).load()} == {'lan'}
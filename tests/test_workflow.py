@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from workflow import WorkflowStage, WorkflowTable
+
+
+def test_register_appends_one_record(tmp_path):
+    path = str(tmp_path / 'workflow.jsonl')
+    table = WorkflowTable(path)
+
+    async def register():
+        await table.register(1, 10, WorkflowStage.describe)
+        await table.register(2, 10, WorkflowStage.post)
+
+    asyncio.run(register())
+    with open(path) as workflow_file:
+        assert len(workflow_file.readlines()) == 2
+    assert WorkflowTable(path).get(2).stage is WorkflowStage.post
+
+
+def test_discarded_events_are_gone_after_reload(tmp_path):
+    path = str(tmp_path / 'workflow.jsonl')
+    table = WorkflowTable(path)
+
+    async def register_and_discard():
+        await table.register(1, 10, WorkflowStage.describe)
+        await table.register(2, 20, WorkflowStage.describe)
+        await table.discard_event(10)
+
+    asyncio.run(register_and_discard())
+    reloaded = WorkflowTable(path)
+    assert reloaded.get(1) is None
+    assert reloaded.get(2).event_uuid == 20
+    # loading compacts the log down to the live entry
+    with open(path) as workflow_file:
+        assert len(workflow_file.readlines()) == 1
+
+
+def test_torn_record_is_dropped(tmp_path):
+    path = tmp_path / 'workflow.jsonl'
+    path.write_text(json.dumps({'op': 'register', 'message_id': 1, 'event_uuid': 10, 'stage': 'describe'}) + '\n'
+                    + '{"op": "regis')
+    table = WorkflowTable(str(path))
+    assert list(table.states) == [1]
+    asyncio.run(table.register(2, 20, WorkflowStage.post))
+    assert set(WorkflowTable(str(path)).states) == {1, 2}
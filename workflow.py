@@ -0,0 +1,90 @@
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+import os
+
+from eventjournal import read_journal
+from events import EVENTS_FILE_PATH, append_records, write_snapshot
+
+WORKFLOW_FILE_NAME = f'{EVENTS_FILE_PATH}/workflow.jsonl'
+# the log is rewritten with only the live entries once it holds this many records and twice as many as are live
+COMPACT_AFTER = 500
+
+
+class WorkflowStage(Enum):
+    # a reply to the message sets the description and image of the event
+    describe = 'describe'
+    # a reply to the message posts the event
+    post = 'post'
+
+
+@dataclass
+class WorkflowState:
+    event_uuid: int
+    stage: WorkflowStage
+
+
+class WorkflowTable:
+    """ Messages the bot posted in the prototype channel, mapped to the event and the step a reply performs.
+
+    Persisted as an append-only log of registrations and discards, so saving a change costs one appended line however
+    many events there are. Entries are dropped once their event is posted, deleted or archived, and the log is
+    compacted down to the live entries when it is loaded and whenever it is mostly dead records.
+    """
+
+    def __init__(self, path: str = WORKFLOW_FILE_NAME) -> None:
+        self.path = path
+        self.states: dict[int, WorkflowState] = {}
+        # message ids by event uuid, so discarding an event doesn't scan the table
+        self.by_event: dict[int, set[int]] = {}
+        self.write_lock = asyncio.Lock()
+        self.records = 0
+        if os.path.exists(path):
+            for record in read_journal(path):
+                self._apply(record)
+            # also drops a record torn by a crash, so new records are never appended after it
+            write_snapshot(self.entries(), self.path, json_lines=True)
+            self.records = len(self.states)
+
+    def get(self, message_id: int) -> WorkflowState | None:
+        return self.states.get(message_id)
+
+    async def register(self, message_id: int, event_uuid: int, stage: WorkflowStage) -> None:
+        record = entry(message_id, WorkflowState(event_uuid, stage))
+        self._apply(record)
+        await self._append(record)
+
+    async def discard_event(self, event_uuid: int) -> None:
+        message_ids = self.by_event.pop(event_uuid, set())
+        for message_id in message_ids:
+            del self.states[message_id]
+        if message_ids:
+            await self._append({'op': 'discard', 'event_uuid': event_uuid})
+
+    def entries(self) -> list[dict]:
+        return [entry(message_id, state) for message_id, state in self.states.items()]
+
+    def _apply(self, record: dict) -> None:
+        if record.get('op') == 'discard':
+            for message_id in self.by_event.pop(record['event_uuid'], set()):
+                del self.states[message_id]
+            return
+        message_id = record['message_id']
+        previous = self.states.get(message_id)
+        if previous is not None:
+            self.by_event[previous.event_uuid].discard(message_id)
+        self.states[message_id] = WorkflowState(record['event_uuid'], WorkflowStage(record['stage']))
+        self.by_event.setdefault(record['event_uuid'], set()).add(message_id)
+
+    async def _append(self, record: dict) -> None:
+        async with self.write_lock:
+            self.records += 1
+            if self.records >= max(COMPACT_AFTER, 2 * len(self.states)):
+                self.records = len(self.states)
+                await asyncio.to_thread(write_snapshot, self.entries(), self.path, json_lines=True)
+            else:
+                await asyncio.to_thread(append_records, [record], self.path)
+
+
+def entry(message_id: int, state: WorkflowState) -> dict:
+    return {'op': 'register', 'message_id': message_id, 'event_uuid': state.event_uuid, 'stage': state.stage.value}